@@ -3,28 +3,47 @@ from __future__ import annotations
 
 import argparse
 import os
+import sys
 from pathlib import Path
 from datetime import datetime
+from typing import TYPE_CHECKING
 
-import matplotlib
-matplotlib.use("Agg")
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-
-try:
-    from mca import MCA as MCA_mca
-    HAS_MCA = True
-except Exception:
-    MCA_mca = None
-    HAS_MCA = False
-
-try:
-    import prince
-    HAS_PRINCE = True
-except Exception:
-    prince = None
-    HAS_PRINCE = False
+sys.path.append(str(Path(__file__).resolve().parent.parent / "common"))
+from alloc_tracking import AllocTracker
+import resources
+
+# numpy, pandas, matplotlib et les backends ACM sont importés au moment de l'analyse,
+# pour que --help ne paie pas leur temps de chargement
+if TYPE_CHECKING:
+    import pandas as pd
+
+MCA_mca = None
+HAS_MCA = False
+prince = None
+HAS_PRINCE = False
+
+# charge les backends ACM optionnels ('mca' puis 'prince')
+def _load_backends() -> None:
+    global MCA_mca, HAS_MCA, prince, HAS_PRINCE
+    try:
+        from mca import MCA as MCA_mca
+        HAS_MCA = True
+    except Exception:
+        MCA_mca = None
+        HAS_MCA = False
+    try:
+        import prince
+        HAS_PRINCE = True
+    except Exception:
+        prince = None
+        HAS_PRINCE = False
+
+# importe pyplot avec le backend non interactif
+def _pyplot():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
 
 CATEGORICAL_CANDIDATES = ("conductive", "full_cube", "spawnable", "movable")
 
@@ -58,6 +77,7 @@ def _resolve_json_path(user_path: Path) -> Path:
 
 # charge le fichier JSON des blocs Minecraft et normalise les noms de colonnes
 def load_blocks_json(path: Path) -> pd.DataFrame:
+    import pandas as pd
     path = _resolve_json_path(path)
     df = pd.read_json(path)
     # Supprime les espaces dans les noms de colonnes
@@ -74,6 +94,7 @@ def choose_categorical(df: pd.DataFrame) -> list[str]:
 # convertit un DataFrame catégoriel en tableau disjonctif complet
 # transforme chaque modalité d'une variable en une colonne binaire
 def to_disjunctive(df_cat: pd.DataFrame) -> pd.DataFrame:
+    import pandas as pd
     for c in df_cat.columns:
         if df_cat[c].dtype == bool:
             df_cat[c] = df_cat[c].map({True: "Yes", False: "No"})
@@ -81,6 +102,8 @@ def to_disjunctive(df_cat: pd.DataFrame) -> pd.DataFrame:
 
 # rffectue l'ACM avec la bibliothèque 'mca' et retourne les coordonnées des individus et modalités
 def fit_mca_with_mca(dc: pd.DataFrame, n_components: int = 2):
+    import numpy as np
+    import pandas as pd
     model = MCA_mca(dc, benzecri=False)
     def _to_df(arr, index, prefix):
         arr = np.asarray(arr)
@@ -104,6 +127,7 @@ def fit_mca_with_mca(dc: pd.DataFrame, n_components: int = 2):
 
 # effectue l'ACM et retourne les coordonnées des individus et modalités
 def fit_mca_with_prince(dc: pd.DataFrame, n_components: int = 2):
+    import numpy as np
     model = prince.MCA(n_components=max(2, n_components), random_state=42).fit(dc)
     explained = np.array(model.explained_inertia_)
     total_inertia = getattr(model, "total_inertia_", None)
@@ -113,35 +137,52 @@ def fit_mca_with_prince(dc: pd.DataFrame, n_components: int = 2):
     return model, eigenvalues, explained, row_coords, col_coords
 
 # crée le répertoire de sortie pour les résultats de l'ACM
-def _make_outdir() -> Path:
-    here = Path(__file__).resolve().parent
-    out = here / "acm_outputs"
+def _make_outdir(out: Path | None = None) -> Path:
+    if out is None:
+        out = Path(__file__).resolve().parent / "acm_outputs"
     out.mkdir(parents=True, exist_ok=True)
     return out
 
 # génère les graphiques, coordonnées et rapport d'analyse
-def run_acm(json_path: Path, max_labels_modalities: int = 50, sample_labels: int = 0) -> None:
-    outdir = _make_outdir()
+# low_alloc : ni copie des colonnes qualitatives ni tableau de comparaison pour repérer les modalités vides
+def run_acm(json_path: Path, max_labels_modalities: int = 50, sample_labels: int = 0, out: Path | None = None,
+            low_alloc: bool = False, tracker: AllocTracker | None = None) -> None:
+    import numpy as np
+    import pandas as pd
+    plt = _pyplot()
+    _load_backends()
+    tracker = tracker or AllocTracker(enabled=False)
+    outdir = _make_outdir(out)
     stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    df = load_blocks_json(json_path)
+    with tracker.stage("load"):
+        df = load_blocks_json(json_path)
     cat_cols = choose_categorical(df)
     if not cat_cols:
         raise ValueError("Aucune variable qualitative détectée. Ajoute p.ex. 'conductive', 'full_cube', 'spawnable', 'movable'.")
     # supprime les lignes avec des valeurs manquantes dans les colonnes catégorielles
     before = len(df)
-    x = df[cat_cols].copy().dropna(axis=0, how="any")
+    with tracker.stage("disjunctive"):
+        if low_alloc:
+            # dropna rend déjà un nouveau tableau : to_disjunctive peut le modifier sans toucher df
+            x = df[cat_cols].dropna(axis=0, how="any")
+        else:
+            x = df[cat_cols].copy().dropna(axis=0, how="any")
+        dc = to_disjunctive(x)
+        # colonnes booléennes : any() suffit, sans construire dc != 0
+        keep = dc.any(axis=0) if low_alloc else (dc != 0).any(axis=0)
+        if not low_alloc or not keep.all():
+            dc = dc.loc[:, keep]
     after = len(x)
-    dc = to_disjunctive(x)
-    dc = dc.loc[:, (dc != 0).any(axis=0)]
     labels = df.loc[x.index, "block"].astype(str) if "block" in df.columns else pd.Index(x.index.astype(str))
-    if HAS_MCA:
-        _, eigenvalues, explained, row_coords, col_coords = fit_mca_with_mca(dc)
-        backend = "mca"
-    elif HAS_PRINCE:
-        _, eigenvalues, explained, row_coords, col_coords = fit_mca_with_prince(dc)
-        backend = "prince"
-    else:
-        raise RuntimeError("Ni 'mca' ni 'prince' n'est installé. Installe: pip install mca prince")
+    with tracker.stage("fit"):
+        if HAS_MCA:
+            _, eigenvalues, explained, row_coords, col_coords = fit_mca_with_mca(dc)
+            backend = "mca"
+        elif HAS_PRINCE:
+            _, eigenvalues, explained, row_coords, col_coords = fit_mca_with_prince(dc)
+            backend = "prince"
+        else:
+            raise RuntimeError("Ni 'mca' ni 'prince' n'est installé. Installe: pip install mca prince")
     if len(row_coords) == len(labels):
         row_coords.index = labels.values
     # génère le scree plot (graphique des valeurs propres)
@@ -208,17 +249,28 @@ def run_acm(json_path: Path, max_labels_modalities: int = 50, sample_labels: int
     (outdir / f"{stamp}_acm_report.txt").write_text("\n".join(report), encoding="utf-8")
 
 def main() -> int:
+    out = None
     try:
         parser = argparse.ArgumentParser(description="ACM sur le dataset Minecraft (qualitatif).")
         default_rel = Path("../../../datasets/minecraft/blocks/blocklist_clean.json")
         parser.add_argument("--path", type=Path, default=default_rel, help="Chemin vers le JSON des blocs.")
         parser.add_argument("--labels-modalites", type=int, default=50, help="Nb max de libellés de modalités à afficher.")
         parser.add_argument("--labels-individus", type=int, default=0, help="Nb d’individus à annoter (0 = aucun).")
+        parser.add_argument("--out", type=Path, default=None, help="Dossier des sorties (défaut : acm_outputs/ à côté du script).")
+        parser.add_argument("--low-alloc", action="store_true", help="Prépare le tableau disjonctif sans copies intermédiaires.")
+        parser.add_argument("--alloc-report", action="store_true", help="Affiche la mémoire allouée par chaque étape (tracemalloc).")
+        resources.add_arguments(parser, jobs=False)
         args = parser.parse_args()
-        run_acm(args.path, max_labels_modalities=args.labels_modalites, sample_labels=args.labels_individus)
+        out = args.out
+        resources.configure(jobs=1, threads=args.threads)
+        tracker = AllocTracker(enabled=args.alloc_report, label="low-alloc" if args.low_alloc else "default",
+                               preload=("pandas",))
+        run_acm(args.path, max_labels_modalities=args.labels_modalites, sample_labels=args.labels_individus, out=out,
+                low_alloc=args.low_alloc, tracker=tracker)
+        tracker.report()
         return 0
     except Exception as e:
-        outdir = _make_outdir()
+        outdir = _make_outdir(out)
         (outdir / "acm_error.txt").write_text(str(e), encoding="utf-8")
         return 1
 
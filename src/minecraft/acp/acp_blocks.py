@@ -2,15 +2,22 @@
 from __future__ import annotations
 
 import argparse
+import sys
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-import numpy as np
-import pandas as pd
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-from sklearn.decomposition import PCA
+sys.path.append(str(Path(__file__).resolve().parent.parent / "common"))
+from alloc_tracking import AllocTracker
+import column_stats
+import resources
+
+# numpy, pandas, matplotlib et sklearn sont importés dans les fonctions qui s'en servent,
+# pour que --help et les erreurs de chemin ne paient pas leur temps de chargement
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    from sklearn.decomposition import PCA
+    from column_stats import TableStats
 
 DEFAULT_RELATIVE_DATASET = Path("../../../datasets/minecraft/blocks/blocklist_clean.json")
 QUANTITATIVE_COLUMNS = [
@@ -23,6 +30,13 @@ QUANTITATIVE_COLUMNS = [
 ]
 CATEGORICAL_COLUMNS_CANDIDATES = ["conductive", "movable", "full_cube", "spawnable"]
 
+# importe pyplot avec le backend non interactif
+def _pyplot():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
 # normalise les valeurs de la colonne 'movable' qui peuvent être des dictionnaires, None, ou des chaînes
 # retourne une catégorie standardisée : "ConditionalYes", "No", "ConditionalBreaks", "Conditional", ou "Unknown"
 def normalize_movable(value: Any) -> str:
@@ -58,7 +72,12 @@ def resolve_dataset_path(user_path: str | None, script_dir: Path) -> Path:
             pass
     raise FileNotFoundError("blocklist_clean.json introuvable via --file ou chemin par défaut.")
 
-def load_dataset(dataset_path: Path) -> tuple[pd.DataFrame, str]:
+# les médianes d'imputation sont lues dans les statistiques du fichier (stats) quand elles existent
+# low_alloc : le tableau filtré n'est pas recopié avant l'imputation (les colonnes modifiées sont remplacées une à une)
+def load_dataset(dataset_path: Path, compact: bool = False, stats: TableStats | None = None,
+                 low_alloc: bool = False) -> tuple[pd.DataFrame, str]:
+    import numpy as np
+    import pandas as pd
     df = pd.read_json(dataset_path)
     # s'assure que toutes les colonnes nécessaires existent, ajoute NaN si manquantes
     for col in QUANTITATIVE_COLUMNS + ["block"] + CATEGORICAL_COLUMNS_CANDIDATES:
@@ -69,26 +88,73 @@ def load_dataset(dataset_path: Path) -> tuple[pd.DataFrame, str]:
     # impute les valeurs manquantes avec la médiane de chaque colonne quantitative
     for col in QUANTITATIVE_COLUMNS:
         df[col] = pd.to_numeric(df[col], errors="coerce")
-    df = df.dropna(subset=QUANTITATIVE_COLUMNS, how="all").copy()
+    df = df.dropna(subset=QUANTITATIVE_COLUMNS, how="all")
+    if not low_alloc:
+        df = df.copy()
     for col in QUANTITATIVE_COLUMNS:
         if df[col].isna().any():
-            df[col] = df[col].fillna(df[col].median())
+            median = stats.median([col])[0] if stats is not None and stats.has([col]) else df[col].median()
+            df[col] = df[col].fillna(median)
+    category_column = "category"
     for cat_col in ["conductive", "movable_cat", "full_cube", "spawnable"]:
         if cat_col in df.columns and not df[cat_col].isna().all():
             df[cat_col] = df[cat_col].astype(str).str.strip().str.title()
-            return df, cat_col
-    df["category"] = "Unknown"
-    return df, "category"
+            category_column = cat_col
+            break
+    else:
+        df["category"] = "Unknown"
+    if compact:
+        compact_frame(df)
+    return df, category_column
+
+# mode compact : variables quantitatives en float32, variables qualitatives en catégories pandas
+# (codes int8 + une seule copie de chaque modalité au lieu d'une chaîne par ligne)
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    import pandas as pd
+    for col in QUANTITATIVE_COLUMNS:
+        df[col] = df[col].astype("float32")
+    for col in CATEGORICAL_COLUMNS_CANDIDATES + ["movable_cat", "category"]:
+        # texte en object (pandas < 3) ou en str (pandas 3) : tout ce qui n'est ni numérique ni déjà catégoriel
+        if (col in df.columns and not pd.api.types.is_numeric_dtype(df[col])
+                and not isinstance(df[col].dtype, pd.CategoricalDtype)):
+            df[col] = df[col].astype("category")
+    return df
+
+# moyennes et écarts-types des colonnes après imputation par la médiane, déduits des statistiques
+# du fichier sans relire les données ; None si elles ne décrivent pas ces lignes
+def stored_moments(stats: TableStats, columns: list[str], n_rows: int) -> tuple[pd.Series, pd.Series] | None:
+    import pandas as pd
+    if not stats.has(columns):
+        return None
+    filled = [stats.filled(col, n_rows, stats.median([col])[0]) for col in columns]
+    if any(f is None for f in filled):
+        return None
+    return (pd.Series([float(f.mean[0]) for f in filled], index=columns),
+            pd.Series([float(f.std(ddof=1)[0]) for f in filled], index=columns))
 
 # standardise les données en calculant le z-score : (x - moyenne) / écart-type
 # transforme les données pour avoir une moyenne de 0 et un écart-type de 1
-def zscore_standardize(df_numeric: pd.DataFrame) -> pd.DataFrame:
-    centered = df_numeric.sub(df_numeric.mean())
-    scaled = centered.div(df_numeric.std(ddof=1))
+# low_alloc : une seule matrice allouée, centrée, réduite et nettoyée sur place (au lieu d'un tableau par opération)
+def zscore_standardize(df_numeric: pd.DataFrame, stats: TableStats | None = None, low_alloc: bool = False) -> pd.DataFrame:
+    import numpy as np
+    import pandas as pd
+    moments = stored_moments(stats, list(df_numeric.columns), len(df_numeric)) if stats is not None else None
+    mean, std = moments if moments is not None else (df_numeric.mean(), df_numeric.std(ddof=1))
+    if low_alloc:
+        values = df_numeric.to_numpy(dtype=float, copy=True)
+        np.subtract(values, mean.to_numpy(float), out=values)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            np.divide(values, std.to_numpy(float), out=values)
+        np.nan_to_num(values, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+        return pd.DataFrame(values, index=df_numeric.index, columns=df_numeric.columns, copy=False)
+    centered = df_numeric.sub(mean)
+    scaled = centered.div(std)
     return scaled.replace([np.inf, -np.inf], np.nan).fillna(0.0)
 
 # génère le cercle des corrélations montrant la contribution des variables aux deux premières composantes
 def save_variables_correlation_plot(pca_model: PCA, feature_names: list[str], output_path: Path):
+    import numpy as np
+    plt = _pyplot()
     loadings = pca_model.components_.T[:, [0, 1]]
     fig, ax = plt.subplots(figsize=(7, 6))
     circle = plt.Circle((0, 0), 1.0, fill=False, linestyle="--", alpha=0.6)
@@ -110,6 +176,8 @@ def save_variables_correlation_plot(pca_model: PCA, feature_names: list[str], ou
 # crée un biplot combiné affichant simultanément les individus et les variables
 # paramètre alpha contrôle l'équilibre entre la représentation des lignes et des colonnes
 def save_combined_biplot(pca_model: PCA, pc_scores: np.ndarray, feature_names: list[str], output_path: Path, alpha: float = 0.5):
+    import numpy as np
+    plt = _pyplot()
     s = pca_model.singular_values_[:2]
     row_coords = pc_scores[:, :2] @ np.diag(s**(alpha - 1.0))
     col_coords = pca_model.components_.T[:, :2] @ np.diag(s**(1.0 - alpha))
@@ -133,24 +201,50 @@ def main():
     script_dir = Path(__file__).resolve().parent
     parser = argparse.ArgumentParser(description="ACP sur le jeu de données Minecraft (centrée-réduite).")
     parser.add_argument("--file", "-f", dest="file", type=str, default=None, help="Chemin vers blocklist_clean.json")
+    parser.add_argument("--compact", action="store_true", help="Types compacts (float32, catégories) pour réduire la mémoire")
+    parser.add_argument("--permutations", type=int, default=500, help="Permutations de l'analyse parallèle de Horn (0 = désactivée, défaut : 500)")
+    parser.add_argument("--percentile", type=float, default=95.0, help="Percentile des spectres nuls servant de seuil (défaut : 95)")
+    parser.add_argument("--seed", type=int, default=42, help="Graine des permutations (défaut : 42)")
+    parser.add_argument("--out", type=Path, default=script_dir / "acp_outputs", help="Dossier des sorties (défaut : acp_outputs/ à côté du script)")
+    parser.add_argument("--low-alloc", action="store_true", help="Chargement et standardisation sans copies intermédiaires du tableau")
+    parser.add_argument("--alloc-report", action="store_true", help="Affiche la mémoire allouée par chaque étape (tracemalloc)")
+    resources.add_arguments(parser, jobs_help="Processus de l'analyse parallèle", jobs_default="CPU count")
     args = parser.parse_args()
 
     dataset_path = resolve_dataset_path(args.file, script_dir)
     print(f"Chargement du jeu de données: {dataset_path}")
+    # fixé avant l'import de numpy : sans --jobs ni --threads, tous les cœurs vont aux threads de l'ACP
+    alloc = resources.configure(args.jobs, args.threads, default_jobs=1)
+
+    import numpy as np
+    import pandas as pd
+    from sklearn.decomposition import PCA
+    plt = _pyplot()
 
-    dataset_frame, category_column = load_dataset(dataset_path)
-    numeric_matrix = dataset_frame[QUANTITATIVE_COLUMNS].copy()
-    standardized_matrix = zscore_standardize(numeric_matrix)
-    print("Standardisation z-score appliquée.")
+    # statistiques écrites avec le fichier par export_clean.py (absentes ou périmées : recalculées)
+    stats = column_stats.load(dataset_path)
+    tracker = AllocTracker(enabled=args.alloc_report, label="low-alloc" if args.low_alloc else "default",
+                           preload=("sklearn.decomposition",))
+    with tracker.stage("load"):
+        dataset_frame, category_column = load_dataset(dataset_path, compact=args.compact, stats=stats,
+                                                      low_alloc=args.low_alloc)
+    print(f"Mémoire du jeu de données: {dataset_frame.memory_usage(deep=True).sum()} octets")
+    with tracker.stage("standardize"):
+        numeric_matrix = dataset_frame[QUANTITATIVE_COLUMNS]
+        if not args.low_alloc:
+            numeric_matrix = numeric_matrix.copy()
+        standardized_matrix = zscore_standardize(numeric_matrix, stats, low_alloc=args.low_alloc)
+    print("Standardisation z-score appliquée" + (" (statistiques du fichier)." if stats is not None else "."))
 
     # effectue l'ACP sur les données standardisées
     # n_components : nombre de composantes à calculer
     n_components = min(len(QUANTITATIVE_COLUMNS), standardized_matrix.shape[1])
     pca_model = PCA(n_components=n_components)
-    principal_component_scores = pca_model.fit_transform(standardized_matrix)
+    with tracker.stage("pca"):
+        principal_component_scores = pca_model.fit_transform(standardized_matrix)
 
-    explained_variance = pca_model.explained_variance_
-    explained_ratio = pca_model.explained_variance_ratio_
+    explained_variance = pca_model.explained_variance_.astype(float)
+    explained_ratio = pca_model.explained_variance_ratio_.astype(float)
     cumulative_ratio = np.cumsum(explained_ratio)
 
     eigen_table = pd.DataFrame({
@@ -162,12 +256,29 @@ def main():
     print("\n=== Tableau des valeurs propres ===")
     print(eigen_table.to_string(index=False))
 
-    out_dir = script_dir / "acp_outputs"
+    out_dir = args.out
     out_dir.mkdir(parents=True, exist_ok=True)
 
     eigen_csv_path = out_dir / "acp_valeurs_propres.csv"
     eigen_table.to_csv(eigen_csv_path, index=False)
 
+    # analyse parallèle : nombre de composantes dont la valeur propre dépasse celle obtenue par hasard
+    if args.permutations > 0:
+        from parallel_analysis import parallel_analysis, uses_process_pool
+        pa_alloc = alloc
+        # les cœurs ne sont partagés entre processus que si les permutations en lancent effectivement
+        if args.jobs is None and args.threads is None and \
+                uses_process_pool(*standardized_matrix.shape, args.permutations, alloc.cores):
+            pa_alloc = resources.plan(default_jobs=alloc.cores)
+            print(f"[INFO] Resources (analyse parallèle): {pa_alloc.describe()}")
+        pa_table, n_suggested = parallel_analysis(
+            standardized_matrix.to_numpy(), explained_variance, n_permutations=args.permutations,
+            percentile=args.percentile, seed=args.seed, workers=pa_alloc.jobs, threads=pa_alloc.threads)
+        print(f"\n=== Analyse parallèle ({args.permutations} permutations, seuil P{args.percentile:g}) ===")
+        print(pa_table.to_string(index=False))
+        print(f"Composantes suggérées : {n_suggested}")
+        pa_table.to_csv(out_dir / "acp_analyse_parallele.csv", index=False)
+
     plt.figure(figsize=(7, 4))
     labels = [f"Dim{i+1}" for i in range(n_components)]
     plt.bar(labels, explained_ratio)
@@ -206,6 +317,12 @@ def main():
     individuals_path = out_dir / "acp_individus.png"
     plt.savefig(individuals_path, dpi=160)
 
+    # paramètres nécessaires pour projeter de nouveaux blocs sans refaire l'ACP
+    model_path = out_dir / "acp_model.npz"
+    np.savez(model_path, features=np.array(QUANTITATIVE_COLUMNS),
+             mean=numeric_matrix.mean().to_numpy(float), std=numeric_matrix.std(ddof=1).to_numpy(float),
+             pca_mean=pca_model.mean_, components=pca_model.components_)
+
     scores_csv_path = out_dir / "acp_scores.csv"
     loadings_csv_path = out_dir / "acp_loadings.csv"
     pd.DataFrame(
@@ -217,6 +334,7 @@ def main():
 
     print("\nTerminé.")
     print(f"Sorties dans: {out_dir.resolve()}")
+    tracker.report()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "common"))
+import resources
+from shared_matrix import MatrixHandle, SharedMatrix, attach
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+DEFAULT_PERCENTILES = (50.0, 95.0, 99.0)
+# au-delà de ce nombre de valeurs permutées (n × p × permutations), le calcul est réparti sur plusieurs processus
+PROCESS_POOL_THRESHOLD = 50_000_000
+# mémoire du lot de matrices permutées, par processus : le lot compte au plus 64 permutations,
+# moins quand n × p est grand (une seule au-delà de 64 Mo par matrice)
+BATCH_BYTES = 64 * 2**20
+
+# valeurs propres de la matrice de covariance de chaque matrice d'un lot (B, n, p), par ordre décroissant
+def batched_eigenvalues(batch: np.ndarray) -> np.ndarray:
+    import numpy as np
+    n = batch.shape[1]
+    cov = np.matmul(batch.transpose(0, 2, 1), batch) / (n - 1)
+    return np.linalg.eigvalsh(cov)[:, ::-1]
+
+# spectres nuls : chaque colonne de Z est permutée indépendamment, ce qui casse les corrélations
+# sans toucher aux distributions marginales ; les permutations sont traitées par lots vectorisés
+# dont la taille (au plus batch_size) est fixée par BATCH_BYTES
+def null_eigenvalues(Z: np.ndarray, n_permutations: int, seed, batch_size: int = 64) -> np.ndarray:
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    Zc = Z - Z.mean(axis=0)
+    n, p = Zc.shape
+    batch_size = max(1, min(batch_size, BATCH_BYTES // (8 * n * p)))
+    out = np.empty((n_permutations, p))
+    buf = np.empty((min(batch_size, n_permutations), n, p))
+    for start in range(0, n_permutations, batch_size):
+        b = min(batch_size, n_permutations - start)
+        view = buf[:b]
+        view[:] = Zc
+        rng.permuted(view, axis=1, out=view)
+        out[start:start + b] = batched_eigenvalues(view)
+    return out
+
+# côté processus : Z est lu dans la mémoire partagée publiée par le processus principal
+def null_eigenvalues_shared(handle: MatrixHandle, n_permutations: int, seed) -> np.ndarray:
+    Z, _ = attach(handle)
+    return null_eigenvalues(Z, n_permutations, seed)
+
+# répartit les permutations entre processus, chacun avec son propre flux aléatoire
+# Z est publié une seule fois en mémoire partagée au lieu d'être copié vers chaque processus
+# chaque processus est limité à `threads` threads BLAS pour ne pas dépasser le budget de cœurs
+def null_eigenvalues_parallel(Z: np.ndarray, n_permutations: int, seed, workers: int, threads: int = 1) -> np.ndarray:
+    import numpy as np
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    counts = [n_permutations // workers + (i < n_permutations % workers) for i in range(workers)]
+    with SharedMatrix(Z) as shared, ProcessPoolExecutor(max_workers=workers, initializer=resources.worker_init,
+                                                        initargs=(threads,)) as pool:
+        parts = pool.map(null_eigenvalues_shared, [shared.handle] * workers, counts, seeds)
+        return np.vstack(list(parts))
+
+# vrai si les permutations sont réparties sur plusieurs processus (sinon elles tournent dans le processus courant)
+def uses_process_pool(n: int, p: int, n_permutations: int, workers: int) -> bool:
+    return workers > 1 and n * p * n_permutations >= PROCESS_POOL_THRESHOLD
+
+# analyse parallèle de Horn : compare chaque valeur propre observée aux percentiles des spectres nuls
+# une composante est retenue tant que sa valeur propre dépasse le seuil (les suivantes sont écartées)
+def parallel_analysis(Z: np.ndarray, observed: np.ndarray, n_permutations: int = 500, percentile: float = 95.0,
+                      seed: int | None = 42, workers: int | None = None, threads: int = 1,
+                      percentiles: tuple[float, ...] = DEFAULT_PERCENTILES) -> tuple[pd.DataFrame, int]:
+    import numpy as np
+    import pandas as pd
+    Z = np.asarray(Z, dtype=float)
+    n, p = Z.shape
+    if workers is None:
+        workers = resources.available_cores()[0]
+    if uses_process_pool(n, p, n_permutations, workers):
+        null = null_eigenvalues_parallel(Z, n_permutations, seed, workers, threads)
+    else:
+        null = null_eigenvalues(Z, n_permutations, seed)
+
+    observed = np.asarray(observed, dtype=float)[:p]
+    k = len(observed)
+    percentiles = tuple(sorted(set(percentiles) | {percentile}))
+    thresholds = np.percentile(null[:, :k], percentiles, axis=0)
+    threshold = thresholds[percentiles.index(percentile)]
+    # p-value de permutation (Buja & Eyuboglu) : part des spectres nuls au moins aussi grands que l'observé
+    p_values = (1 + np.sum(null[:, :k] >= observed, axis=0)) / (n_permutations + 1)
+
+    above = observed > threshold
+    suggested = int(np.argmin(above)) if not above.all() else k
+
+    table = pd.DataFrame({
+        "Dimension": [f"Dim{i+1}" for i in range(k)],
+        "Valeur propre": observed,
+        "Moyenne nulle": null[:, :k].mean(axis=0),
+    })
+    for q, row in zip(percentiles, thresholds):
+        table[f"Seuil P{q:g}"] = row
+    table["p-value"] = p_values
+    table["Retenue"] = np.arange(k) < suggested
+    return table, suggested
@@ -2,37 +2,44 @@
 from __future__ import annotations
 
 import argparse
+import sys
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import TYPE_CHECKING, List, Tuple, Optional
 
-import numpy as np
-import pandas as pd
+sys.path.append(str(Path(__file__).resolve().parent.parent / "common"))
+import resources
+import schema
 
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-
-from scipy.stats import chi2_contingency
+# numpy, pandas, matplotlib et scipy sont importés dans les fonctions qui s'en servent,
+# pour que --help ne paie pas leur temps de chargement
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
 
 DEFAULT_INPUT = Path("../../../datasets/minecraft/blocks/blocklist_clean.json")
 CATEGORICAL_CANDIDATES = ("conductive", "full_cube", "spawnable", "movable")
 
+# importe pyplot avec le backend non interactif
+def _pyplot():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
 # lit un fichier de données et retourne un DataFrame
 def read_any(input_path: Path, sep: Optional[str] = None) -> pd.DataFrame:
+    import pandas as pd
     ext = input_path.suffix.lower()
     if ext == ".json":
         return pd.read_json(input_path)
     if ext in {".csv", ".tsv", ".txt"}:
-        if sep is not None:
-            return pd.read_csv(input_path, sep=sep)
-        for candidate in [",", ";", "\t", "|"]:
-            try:
-                df = pd.read_csv(input_path, sep=candidate)
-                if df.shape[1] >= 2:
-                    return df
-            except Exception:
-                pass
-        return pd.read_csv(input_path)
+        # le séparateur est deviné sur la seule ligne d'en-tête, le fichier n'est lu qu'une fois
+        if sep is None:
+            sep = schema.sniff_sep(input_path)
+        # table de blocs propre : types déclarés dans common/schema.py
+        if set(schema.COLUMNS) <= set(schema.header(input_path, sep)):
+            return schema.read_clean(input_path, sep=sep)
+        return pd.read_csv(input_path, sep=sep)
     return pd.read_table(input_path)
 
 # retourne les colonnes catégorielles candidates présentes dans le DataFrame
@@ -41,6 +48,7 @@ def candidate_categoricals(df: pd.DataFrame) -> List[str]:
 
 # cnstruit une table de contingence entre deux variables catégorielles
 def build_contingency_table(df: pd.DataFrame, col_x: str, col_y: str) -> pd.DataFrame:
+    import pandas as pd
     x = df[col_x].astype(str)
     y = df[col_y].astype(str)
     ct = pd.crosstab(x, y)
@@ -52,27 +60,27 @@ def build_contingency_table(df: pd.DataFrame, col_x: str, col_y: str) -> pd.Data
 
 # standardise les données et supprime les colonnes constantes
 # retourne la matrice standardisée et la liste des colonnes conservées
+# les écarts-types servent à la fois au filtrage et à la réduction : calculés une seule fois
 def zscore_and_prune(M: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
+    import numpy as np
     std = M.std(axis=0, ddof=1)
     keep = std > 0
     if keep.sum() < 1:
         raise ValueError("All columns are constant.")
     M2 = M.loc[:, keep]
-    if M2.shape[1] == 1:
-        Z = (M2 - M2.mean(axis=0)) / M2.std(axis=0, ddof=1)
-        Z = Z.replace([np.inf, -np.inf], np.nan).fillna(0.0)
-        return Z, list(M2.columns)
-    Z = (M2 - M2.mean(axis=0)) / M2.std(axis=0, ddof=1)
+    Z = (M2 - M2.mean(axis=0)) / std[keep]
     Z = Z.replace([np.inf, -np.inf], np.nan).fillna(0.0)
     return Z, list(M2.columns)
 
 # calcule la p-value du test du chi-deux d'indépendance sur une table de contingence
 def chi2_pvalue(ct: pd.DataFrame) -> float:
+    from scipy.stats import chi2_contingency
     chi2, p, dof, exp = chi2_contingency(ct, correction=False)
     return float(p)
 
 # calcule les valeurs propres et vecteurs propres de la matrice de corrélation
 def eigenvalues_from_corr(Z: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    import numpy as np
     C = np.corrcoef(Z, rowvar=False)
     w, V = np.linalg.eigh(C)
     # Trie par ordre décroissant des valeurs propres
@@ -81,6 +89,7 @@ def eigenvalues_from_corr(Z: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
 
 # détermine le nombre de facteurs à retenir selon le critère de Kaiser
 def choose_num_factors(ev: np.ndarray, n_rows: int, n_cols: int) -> int:
+    import numpy as np
     n_max = max(1, min(n_cols - 1, n_rows - 1))
     n_keep = int(np.sum(ev >= 1.0))
     if n_keep <= 0:
@@ -89,6 +98,7 @@ def choose_num_factors(ev: np.ndarray, n_rows: int, n_cols: int) -> int:
 
 # calcule les loadings (contributions) et scores factoriels des k premières composantes
 def pca_scores_and_loadings(Z: pd.DataFrame, V: np.ndarray, ev: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    import numpy as np
     V_k = V[:, :k]
     ev_k = ev[:k]
     L = V_k * np.sqrt(ev_k)
@@ -98,6 +108,7 @@ def pca_scores_and_loadings(Z: pd.DataFrame, V: np.ndarray, ev: np.ndarray, k: i
 # applique la rotation Varimax pour simplifier l'interprétation des facteurs
 # maximise la variance des loadings au carré pour obtenir une structure simple
 def varimax(Phi: np.ndarray, gamma: float = 1.0, q: int = 100, tol: float = 1e-6) -> Tuple[np.ndarray, np.ndarray]:
+    import numpy as np
     p, k = Phi.shape
     if k < 2:
         return Phi, np.eye(k)
@@ -123,6 +134,8 @@ def quartimax(Phi: np.ndarray, q: int = 100, tol: float = 1e-6) -> Tuple[np.ndar
 
 # génère le scree plot
 def plot_scree(ev: np.ndarray, out_path: Path) -> None:
+    import numpy as np
+    plt = _pyplot()
     plt.figure(figsize=(7, 4))
     xs = np.arange(1, len(ev) + 1)
     plt.scatter(xs, ev)
@@ -138,6 +151,7 @@ def plot_scree(ev: np.ndarray, out_path: Path) -> None:
 # génère la carte factorielle affichant les variables et modalités
 # visualise les relations entre modalités et variables dans l'espace des deux premiers facteurs
 def plot_factor_map(loadings: np.ndarray, scores: np.ndarray, ct_cols: List[str], ct_rows: List[str], title: str, out_path: Path) -> None:
+    plt = _pyplot()
     x_idx = 0
     y_idx = 1 if loadings.shape[1] > 1 else 0
     fig, ax = plt.subplots(figsize=(7, 6))
@@ -157,9 +171,10 @@ def plot_factor_map(loadings: np.ndarray, scores: np.ndarray, ct_cols: List[str]
     fig.savefig(out_path, dpi=160)
     plt.close(fig)
 
-# sélectionne automatiquement la meilleure paire de variables catégorielles
-# choisit la paire avec la plus petite p-value (< 0.05) au test du chi-deux
-def auto_select_best_pair(df: pd.DataFrame) -> Tuple[str, str, float]:
+# teste toutes les paires de variables catégorielles candidates
+# retourne les paires significatives (p < 0.05), de la plus petite p-value à la plus grande
+def significant_pairs(df: pd.DataFrame) -> List[Tuple[str, str, float]]:
+    import numpy as np
     cands = candidate_categoricals(df)
     if len(cands) < 2:
         raise ValueError("Need at least two of the required categorical columns.")
@@ -177,37 +192,23 @@ def auto_select_best_pair(df: pd.DataFrame) -> Tuple[str, str, float]:
     if not tested:
         raise ValueError("No valid categorical pair found.")
     tested.sort(key=lambda t: t[2])
-    best_sig = [t for t in tested if t[2] < 0.05]
-    if not best_sig:
+    significant = [t for t in tested if t[2] < 0.05]
+    if not significant:
         raise ValueError("No column pair yields chi-square p < 0.05. Aborting as requested.")
-    return best_sig[0]
+    return significant
 
-def main() -> None:
-    ap = argparse.ArgumentParser(description="AFC (TD-style) headless on categorical pair with p<0.05.")
-    ap.add_argument("--file", default=None, help="CSV/JSON path (default: ../../../datasets/minecraft/blocks/blocklist_clean.json)")
-    ap.add_argument("--sep", default=None, help="CSV separator")
-    ap.add_argument("--x", default=None, help="Column for rows (categorical)")
-    ap.add_argument("--y", default=None, help="Column for cols (categorical)")
-    ap.add_argument("--out", default="afc_outputs", help="Output directory")
-    args = ap.parse_args()
+# sélectionne automatiquement la meilleure paire de variables catégorielles
+# choisit la paire avec la plus petite p-value (< 0.05) au test du chi-deux
+def auto_select_best_pair(df: pd.DataFrame) -> Tuple[str, str, float]:
+    return significant_pairs(df)[0]
 
-    input_path = Path(args.file) if args.file else DEFAULT_INPUT
-    if not input_path.exists():
-        raise FileNotFoundError(f"Input file not found: {input_path}")
-    output_dir = Path(args.out)
+# AFC complète d'une paire : table de contingence, test d'indépendance, valeurs propres,
+# rotations et cartes factorielles, écrites dans output_dir
+# retourne le résumé de la paire (une ligne de pairs_index.csv)
+def run_pair(df: pd.DataFrame, col_x: str, col_y: str, output_dir: Path) -> dict:
+    import numpy as np
+    import pandas as pd
     output_dir.mkdir(parents=True, exist_ok=True)
-
-    df = read_any(input_path, sep=args.sep)
-
-    # sélection automatique des colonnes si non spécifiées
-    if args.x is None or args.y is None:
-        col_x, col_y, p_auto = auto_select_best_pair(df)
-        print(f"[auto] colonnes sélectionnées: x='{col_x}', y='{col_y}' (p={p_auto:.6g})")
-        with open(output_dir / "auto_selection.txt", "w", encoding="utf-8") as f:
-            f.write(f"x={col_x}\ny={col_y}\np_value={p_auto:.6g}\n")
-    else:
-        col_x, col_y = args.x, args.y
-
     ct = build_contingency_table(df, col_x, col_y)
     print(f"Table de contingence: {ct.shape[0]}x{ct.shape[1]}")
     ct.to_csv(output_dir / "contingency_table.csv", encoding="utf-8")
@@ -239,8 +240,82 @@ def main() -> None:
     plot_factor_map(L_none, S_none, kept_cols, list(ct.index), "AFC — PCA (aucune rotation)", output_dir / "factor_map_pca_aucune_rotation.png")
     plot_factor_map(L_var, S_var, kept_cols, list(ct.index), "AFC — PCA (varimax)", output_dir / "factor_map_pca_varimax.png")
     plot_factor_map(L_qua, S_qua, kept_cols, list(ct.index), "AFC — PCA (quartimax)", output_dir / "factor_map_pca_quartimax.png")
+    return {"x": col_x, "y": col_y, "p_value": p_chi2, "rows": ct.shape[0], "cols": ct.shape[1],
+            "factors": n_keep, "eigenvalue_1": float(ev[0]), "directory": str(output_dir)}
+
+# côté processus : la sortie console de chaque paire est gardée dans son dossier (afc.log)
+# pour ne pas mélanger les paires
+def run_pair_logged(df: pd.DataFrame, col_x: str, col_y: str, output_dir: Path) -> dict:
+    import contextlib
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "afc.log", "w", encoding="utf-8") as f, contextlib.redirect_stdout(f):
+        return run_pair(df, col_x, col_y, output_dir)
+
+# AFC de toutes les paires significatives, réparties sur `jobs` processus
+# chaque paire a son sous-dossier <x>__<y> ; pairs_index.csv résume les paires par p-value croissante
+def run_all_pairs(df: pd.DataFrame, output_dir: Path, jobs: int, threads: int) -> Path:
+    import csv
+    from concurrent.futures import ProcessPoolExecutor
+    pairs = significant_pairs(df)
+    print(f"[all-pairs] {len(pairs)} paires significatives, {min(jobs, len(pairs))} à la fois")
+    # chaque processus ne reçoit que les deux colonnes de sa paire
+    args = [(df[[x, y]], x, y, output_dir / f"{x}__{y}") for x, y, _ in pairs]
+    if jobs <= 1 or len(pairs) <= 1:
+        rows = [run_pair_logged(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(pairs)), initializer=resources.worker_init,
+                                 initargs=(threads,)) as pool:
+            rows = list(pool.map(run_pair_logged, *zip(*args)))
+    for row in rows:
+        print(f"  {row['x']} x {row['y']}: p={row['p_value']:.6g}, {row['factors']} facteur(s) -> {row['directory']}")
+        # l'index reste valable si le dossier de sorties est déplacé
+        row["directory"] = Path(row["directory"]).name
+    index_path = output_dir / "pairs_index.csv"
+    with open(index_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return index_path
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="AFC (TD-style) headless on categorical pair with p<0.05.")
+    ap.add_argument("--file", default=None, help="CSV/JSON path (default: ../../../datasets/minecraft/blocks/blocklist_clean.json)")
+    ap.add_argument("--sep", default=None, help="CSV separator")
+    ap.add_argument("--x", default=None, help="Column for rows (categorical)")
+    ap.add_argument("--y", default=None, help="Column for cols (categorical)")
+    ap.add_argument("--out", default="afc_outputs", help="Output directory")
+    ap.add_argument("--all-pairs", action="store_true", help="Analyse every pair with p<0.05, one sub-directory each, plus pairs_index.csv")
+    resources.add_arguments(ap, jobs_help="Pairs analysed at the same time (--all-pairs)", jobs_default="CPU count")
+    args = ap.parse_args()
+    if args.all_pairs:
+        alloc = resources.configure(args.jobs, args.threads, default_jobs=resources.available_cores()[0])
+    else:
+        alloc = resources.configure(1, args.threads)
+
+    input_path = Path(args.file) if args.file else DEFAULT_INPUT
+    if not input_path.exists():
+        raise FileNotFoundError(f"Input file not found: {input_path}")
+    output_dir = Path(args.out)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    df = read_any(input_path, sep=args.sep)
+
+    if args.all_pairs:
+        index_path = run_all_pairs(df, output_dir, alloc.jobs, alloc.threads)
+        print(f"Terminé. Index des paires: {index_path.resolve()}")
+        return
+
+    # sélection automatique des colonnes si non spécifiées
+    if args.x is None or args.y is None:
+        col_x, col_y, p_auto = auto_select_best_pair(df)
+        print(f"[auto] colonnes sélectionnées: x='{col_x}', y='{col_y}' (p={p_auto:.6g})")
+        with open(output_dir / "auto_selection.txt", "w", encoding="utf-8") as f:
+            f.write(f"x={col_x}\ny={col_y}\np_value={p_auto:.6g}\n")
+    else:
+        col_x, col_y = args.x, args.y
 
+    run_pair(df, col_x, col_y, output_dir)
     print(f"Terminé. Dossier des sorties: {output_dir.resolve()}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
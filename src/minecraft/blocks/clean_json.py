@@ -1,10 +1,13 @@
+import argparse
 import json
 import re
 from math import isfinite
+from pathlib import Path
 
 # ---- CONFIG ----
-blocklist_path = "../../../datasets/minecraft/blocks/blocklist.json"
-out_path = "blocklist_clean.json"
+dataset_dir = Path(__file__).resolve().parent.parent.parent.parent / "datasets" / "minecraft" / "blocks"
+blocklist_path = dataset_dir / "blocklist.json"
+out_path = dataset_dir / "blocklist_clean.json"
 
 # ---- HELPERS (float-preserving) ----
 
@@ -120,59 +123,73 @@ def per_variant_numeric(field_value, variant_name):
         return nv
     return averagef_or_none(field_value)
 
-# ---- LOAD ----
+# ---- TRANSFORM ----
 
-with open(blocklist_path, "r", encoding="utf-8") as f:
-    blocks = json.load(f)
+def iter_clean_blocks(blocks):
+    """Yields the clean rows one at a time, in the order of the block list."""
+    for block in blocks:
+        base_block_name = block.get("block")
+        variants = listify_variants(block.get("variants"))
+        if not variants:
+            variants = [base_block_name] if base_block_name else []
 
-# ---- TRANSFORM ----
+        for variant in variants:
+            row = {
+                "block": variant,
+                "number_of_variants": len(variants),
+            }
+
+            h = per_variant_dimension(block.get("height_external"), variant)
+            w = per_variant_dimension(block.get("width_external"), variant)
+            h_i = int(h) if h is not None else 0
+            w_i = int(w) if w is not None else 0
+            row["height_external"] = h_i
+            row["width_external"]  = w_i
+            row["volume"] = w_i * w_i * h_i
+
+            br = per_variant_numeric(block.get("blast_resistance"), variant)
+            if br is not None:
+                row["blast_resistance"] = br
+
+            lum = per_variant_numeric(block.get("luminance"), variant)
+            if lum is not None:
+                row["luminance"] = lum
 
-cleaned_blocks = []
+            for k in ("conductive", "full_cube", "spawnable"):
+                v = block.get(k)
+                ynm = yes_no_maybe_from_states(v)
+                if ynm is not None:
+                    row[k] = ynm
 
-for block in blocks:
-    base_block_name = block.get("block")
-    variants = listify_variants(block.get("variants"))
-    if not variants:
-        variants = [base_block_name] if base_block_name else []
+            mv = block.get("movable")
+            if mv is not None:
+                ynm = yes_no_maybe_from_states(mv)
+                row["movable"] = ynm if ynm is not None else (mv if isinstance(mv, str) and mv else None)
 
-    for variant in variants:
-        row = {
-            "block": variant,
-            "number_of_variants": len(variants),
-        }
+            yield row
 
-        h = per_variant_dimension(block.get("height_external"), variant)
-        w = per_variant_dimension(block.get("width_external"), variant)
-        h_i = int(h) if h is not None else 0
-        w_i = int(w) if w is not None else 0
-        row["height_external"] = h_i
-        row["width_external"]  = w_i
-        row["volume"] = w_i * w_i * h_i
+def clean_blocks(blocks):
+    return list(iter_clean_blocks(blocks))
 
-        br = per_variant_numeric(block.get("blast_resistance"), variant)
-        if br is not None:
-            row["blast_resistance"] = br
+def main():
+    p = argparse.ArgumentParser(description="Flatten blocklist.json into one row per block variant.")
+    p.add_argument("--input", type=Path, default=blocklist_path, help=f"Raw block list (default: {blocklist_path})")
+    p.add_argument("--output", type=Path, default=out_path, help=f"Clean JSON to write (default: {out_path})")
+    args = p.parse_args()
 
-        lum = per_variant_numeric(block.get("luminance"), variant)
-        if lum is not None:
-            row["luminance"] = lum
+    # ---- LOAD ----
 
-        for k in ("conductive", "full_cube", "spawnable"):
-            v = block.get(k)
-            ynm = yes_no_maybe_from_states(v)
-            if ynm is not None:
-                row[k] = ynm
+    with open(args.input, "r", encoding="utf-8") as f:
+        blocks = json.load(f)
 
-        mv = block.get("movable")
-        if mv is not None:
-            ynm = yes_no_maybe_from_states(mv)
-            row["movable"] = ynm if ynm is not None else (mv if isinstance(mv, str) and mv else None)
+    cleaned_blocks = clean_blocks(blocks)
 
-        cleaned_blocks.append(row)
+    # ---- SAVE ----
 
-# ---- SAVE ----
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(cleaned_blocks, f, indent=2, ensure_ascii=False)
 
-with open(out_path, "w", encoding="utf-8") as f:
-    json.dump(cleaned_blocks, f, indent=2, ensure_ascii=False)
+    print(f"{args.output} generated with per-variant rows, float blast_resistance, and Yes/No/Maybe states.")
 
-print(f"{out_path} generated with per-variant rows, float blast_resistance, and Yes/No/Maybe states.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Single-pass clean export
+------------------------
+
+Cleans blocklist.json (same rules as clean_json.py) and writes every clean
+row, as soon as it is produced, to each requested output:
+
+  --json     blocklist_clean.json (same layout as clean_json.py)
+  --csv      blocklist_clean.csv  (same content as json_to_csv.py)
+  --encoded  clustering/results/clean.csv (qualitative levels replaced by
+             their ordinal codes, as importdata.py does)
+
+This replaces the clean_json.py -> json_to_csv.py -> importdata.py chain,
+which writes the clean rows as JSON, parses them back into a DataFrame to
+write the CSV, then parses the CSV again to encode it.
+
+The rows are summarized on the way (common/column_stats.py) and every output
+gets its `<file>.stats.json` sidecar, read by the analyses to standardize and
+impute without another pass.
+
+Usage:
+  python export_clean.py
+  python export_clean.py --input blocklist.json --csv out.csv --no-json --no-encoded
+"""
+
+import argparse
+import csv
+import json
+import sys
+import textwrap
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "common"))
+from column_stats import ColumnStats
+import schema
+
+from clean_json import blocklist_path, dataset_dir, iter_clean_blocks
+
+default_json = dataset_dir / "blocklist_clean.json"
+default_csv = dataset_dir / "blocklist_clean.csv"
+default_encoded = Path(__file__).resolve().parent.parent / "clustering" / "results" / "clean.csv"
+
+CODES = {c: schema.codes(c) for c in schema.CATEGORICAL_COLUMNS}
+
+
+def cell(value) -> str:
+    # missing values are empty cells, floats keep their shortest round-trip form, as pandas writes them
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def encoded_row(row: dict) -> dict:
+    return row | {c: CODES[c].get(row.get(c)) for c in schema.CATEGORICAL_COLUMNS}
+
+
+class CsvSink:
+    def __init__(self, path: Path, encode: bool = False):
+        self.path = path
+        self.encode = encode
+        self.file = open(path, "w", newline="", encoding=schema.ENCODING)
+        self.writer = csv.writer(self.file, delimiter=schema.SEP, lineterminator="\n")
+        self.writer.writerow(schema.COLUMNS)
+
+    def write(self, row: dict):
+        if self.encode:
+            row = encoded_row(row)
+        self.writer.writerow([cell(row.get(c)) for c in schema.COLUMNS])
+
+    def close(self):
+        self.file.close()
+
+
+class JsonSink:
+    """JSON array written one element at a time, laid out like json.dump(rows, indent=2)."""
+
+    encode = False
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.file = open(path, "w", encoding="utf-8")
+        self.count = 0
+
+    def write(self, row: dict):
+        self.file.write("[\n" if self.count == 0 else ",\n")
+        self.file.write(textwrap.indent(json.dumps(row, indent=2, ensure_ascii=False), "  "))
+        self.count += 1
+
+    def close(self):
+        self.file.write("\n]" if self.count else "[]")
+        self.file.close()
+
+
+def export(input_path: Path, sinks: list, stats: ColumnStats | None = None) -> int:
+    with open(input_path, "r", encoding="utf-8") as f:
+        blocks = json.load(f)
+    count = 0
+    try:
+        for row in iter_clean_blocks(blocks):
+            for sink in sinks:
+                sink.write(row)
+            if stats is not None:
+                stats.update_row(row)
+            count += 1
+    finally:
+        for sink in sinks:
+            sink.close()
+    return count
+
+
+def main():
+    p = argparse.ArgumentParser(description="Clean blocklist.json and write the clean rows to JSON, CSV and encoded CSV in one pass.")
+    p.add_argument("--input", type=Path, default=blocklist_path, help=f"Raw block list (default: {blocklist_path})")
+    p.add_argument("--json", type=Path, default=default_json, help=f"Clean JSON (default: {default_json})")
+    p.add_argument("--csv", type=Path, default=default_csv, help=f"Clean CSV (default: {default_csv})")
+    p.add_argument("--encoded", type=Path, default=default_encoded, help=f"Encoded CSV (default: {default_encoded})")
+    p.add_argument("--no-json", action="store_true", help="Do not write the clean JSON")
+    p.add_argument("--no-csv", action="store_true", help="Do not write the clean CSV")
+    p.add_argument("--no-encoded", action="store_true", help="Do not write the encoded CSV")
+    args = p.parse_args()
+
+    sinks = []
+    if not args.no_json:
+        sinks.append(JsonSink(args.json))
+    if not args.no_csv:
+        sinks.append(CsvSink(args.csv))
+    if not args.no_encoded:
+        args.encoded.parent.mkdir(parents=True, exist_ok=True)
+        sinks.append(CsvSink(args.encoded, encode=True))
+    if not sinks:
+        p.error("nothing to write")
+
+    # the raw list is loaded whole: keeping the numeric values for exact medians costs little more
+    stats = ColumnStats(schema.NUMERIC_COLUMNS, schema.CATEGORICAL_COLUMNS, exact_median=True)
+    count = export(args.input, sinks, stats)
+    for sink in sinks:
+        print(f"[INFO] Wrote {count} rows to {sink.path}")
+        # written once the file is complete: the sidecar records its size and mtime
+        stats.save(sink.path, encoded=sink.encode)
+
+
+if __name__ == "__main__":
+    main()
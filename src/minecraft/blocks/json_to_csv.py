@@ -1,9 +1,17 @@
 #!/usr/bin/python3
 
-# Run from project root
+import argparse
+from pathlib import Path
+
+dataset_dir = Path(__file__).resolve().parent.parent.parent.parent / "datasets" / "minecraft" / "blocks"
+
+p = argparse.ArgumentParser(description="Convert the clean block list from JSON to semicolon-separated CSV.")
+p.add_argument("--input", type=Path, default=dataset_dir / "blocklist_clean.json", help="Clean JSON to read")
+p.add_argument("--output", type=Path, default=dataset_dir / "blocklist_clean.csv", help="CSV to write")
+args = p.parse_args()
 
 import pandas as pd
 
-with open("./datasets/minecraft/blocks/blocklist_clean.json", encoding="utf-8") as inputfile:
+with open(args.input, encoding="utf-8") as inputfile:
     df = pd.read_json(inputfile)
-df.to_csv("./datasets/minecraft/blocks/blocklist_clean.csv", sep=";", encoding="utf-8", index=False)
+df.to_csv(args.output, sep=";", encoding="utf-8", index=False)
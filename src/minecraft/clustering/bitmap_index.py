@@ -0,0 +1,253 @@
+"""
+Bitmap index over the encoded block table
+-----------------------------------------
+
+Answers conjunctive filters such as
+
+    conductive == Yes and movable != No and blast_resistance > 6 and luminance > 0
+
+(a level holding `and` or a comma is quoted: spawnable == "Ocelots and Parrots Only")
+and group-by counts without scanning the table:
+
+- every level of a qualitative column (codes of importdata.MAP_*, and the
+  `cluster` column when present) has a bitmap of the rows holding it;
+- every numeric column has its rows sorted by value, so a comparison is two
+  binary searches and a slice.
+
+Bitmaps are Python integers (bit i = row i): AND, OR and popcount run in C
+over n/64 machine words. The index is saved next to the table
+(`<table>.index.npz`) and rebuilt only when the table changes, so opening it
+needs numpy but neither pandas nor a parse of the CSV.
+
+    index = BlockIndex.open(PathCsvWithClusters)
+    rows = index.filter("conductive == Yes and blast_resistance > 6")
+    index.count(rows), index.names(rows)[:10], index.group_counts("movable", rows)
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from const import casefold_map
+import schema
+
+if TYPE_CHECKING:
+    import numpy as np
+
+INDEX_VERSION = 1
+TERM = re.compile(r"^\s*(\w+)\s*(==|!=|<=|>=|<|>|\bin\b)\s*(.+?)\s*$")
+AND = re.compile(r"\s+and\s+", re.IGNORECASE)
+COMMA = re.compile(r"\s*,\s*")
+
+
+def split_outside(text: str, sep: re.Pattern) -> list[str]:
+    """
+    Parts of `text` between the matches of `sep` found outside quotes and parentheses,
+    so that a quoted level may contain `and` or a comma.
+
+    >>> split_outside('spawnable == "Ocelots and Parrots Only" and luminance > 0', AND)
+    ['spawnable == "Ocelots and Parrots Only"', 'luminance > 0']
+    >>> split_outside('spawnable in ("Ocelots and Parrots Only", Yes) and movable != No', AND)
+    ['spawnable in ("Ocelots and Parrots Only", Yes)', 'movable != No']
+    >>> split_outside("'Ocelots and Parrots Only', Yes", COMMA)
+    ["'Ocelots and Parrots Only'", 'Yes']
+    """
+    parts, start, depth, i = [], 0, 0, 0
+    while i < len(text):
+        ch = text[i]
+        if ch in "\"'":
+            end = text.find(ch, i + 1)
+            i = len(text) if end < 0 else end + 1
+            continue
+        if ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth = max(0, depth - 1)
+        elif depth == 0 and (m := sep.match(text, i)):
+            parts.append(text[start:i])
+            start = i = m.end()
+            continue
+        i += 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+class QueryError(ValueError):
+    pass
+
+
+def mask_to_bitmap(mask: np.ndarray) -> int:
+    import numpy as np
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def index_path(table: Path) -> Path:
+    return table.with_name(table.name + ".index.npz")
+
+
+class BlockIndex:
+    def __init__(self, n: int, names: np.ndarray, levels: dict[str, list], packed: dict[str, np.ndarray],
+                 sorted_rows: dict[str, np.ndarray], sorted_values: dict[str, np.ndarray]):
+        self.n = n
+        self.all = (1 << n) - 1
+        self._names = names
+        self.levels = levels                    # qualitative column -> labels, by code
+        self._packed = packed                   # qualitative column -> (levels, n/8) packed bitmaps
+        self._bitmaps: dict[str, list[int]] = {}
+        self.sorted_rows = sorted_rows          # numeric column -> row ids by increasing value (NaN excluded)
+        self.sorted_values = sorted_values      # numeric column -> the matching values
+
+    # ---- building and persistence ----
+
+    @classmethod
+    def build(cls, table: Path) -> BlockIndex:
+        import numpy as np
+        df = schema.read_clean(table, encoded=True, extra_dtypes={"cluster": "int64"})
+        levels, packed = {}, {}
+        categorical = list(schema.CATEGORICAL_COLUMNS) + (["cluster"] if "cluster" in df.columns else [])
+        for c in categorical:
+            codes = df[c].to_numpy()
+            labels = list(schema.LEVELS[c]) if c in schema.LEVELS else [str(v) for v in range(int(codes.max()) + 1)]
+            levels[c] = labels
+            packed[c] = np.stack([np.packbits(codes == code, bitorder="little") for code in range(len(labels))])
+        sorted_rows, sorted_values = {}, {}
+        for c in schema.NUMERIC_COLUMNS:
+            values = df[c].to_numpy(dtype=float)
+            order = np.argsort(values, kind="stable")
+            order = order[~np.isnan(values[order])]
+            sorted_rows[c], sorted_values[c] = order, values[order]
+        return cls(len(df), df[schema.NAME_COLUMN].to_numpy(dtype=str), levels, packed, sorted_rows, sorted_values)
+
+    def save(self, path: Path, source: Path):
+        import json
+        import numpy as np
+        st = source.stat()
+        meta = {"version": INDEX_VERSION, "source": [st.st_mtime_ns, st.st_size], "n": self.n, "levels": self.levels}
+        arrays = {"meta": np.array(json.dumps(meta)), "names": self._names}
+        arrays |= {f"bitmap:{c}": b for c, b in self._packed.items()}
+        arrays |= {f"rows:{c}": r for c, r in self.sorted_rows.items()}
+        arrays |= {f"values:{c}": v for c, v in self.sorted_values.items()}
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path, source: Path) -> BlockIndex | None:
+        """The saved index of `source`, or None when it is missing or older than the table."""
+        import json
+        import numpy as np
+        if not path.exists():
+            return None
+        with np.load(path) as f:
+            meta = json.loads(str(f["meta"]))
+            st = source.stat()
+            if meta["version"] != INDEX_VERSION or meta["source"] != [st.st_mtime_ns, st.st_size]:
+                return None
+            packed = {k.split(":", 1)[1]: f[k] for k in f.files if k.startswith("bitmap:")}
+            rows = {k.split(":", 1)[1]: f[k] for k in f.files if k.startswith("rows:")}
+            values = {k.split(":", 1)[1]: f[k] for k in f.files if k.startswith("values:")}
+            return cls(meta["n"], f["names"], meta["levels"], packed, rows, values)
+
+    @classmethod
+    def open(cls, table: Path, rebuild: bool = False) -> BlockIndex:
+        path = index_path(table)
+        index = None if rebuild else cls.load(path, table)
+        if index is None:
+            index = cls.build(table)
+            index.save(path, table)
+        return index
+
+    # ---- bitmaps ----
+
+    def bitmap(self, column: str, code: int) -> int:
+        if column not in self._bitmaps:
+            self._bitmaps[column] = [int.from_bytes(row.tobytes(), "little") for row in self._packed[column]]
+        return self._bitmaps[column][code]
+
+    def rows_bitmap(self, rows: np.ndarray) -> int:
+        import numpy as np
+        mask = np.zeros(self.n, dtype=bool)
+        mask[rows] = True
+        return mask_to_bitmap(mask)
+
+    def rows(self, bitmap: int) -> np.ndarray:
+        import numpy as np
+        bits = np.unpackbits(np.frombuffer(bitmap.to_bytes((self.n + 7) // 8, "little"), dtype=np.uint8),
+                             bitorder="little")
+        return np.flatnonzero(bits[:self.n])
+
+    def names(self, bitmap: int) -> list[str]:
+        return [str(self._names[i]) for i in self.rows(bitmap)]
+
+    @staticmethod
+    def count(bitmap: int) -> int:
+        return bitmap.bit_count()
+
+    # ---- queries ----
+
+    def code(self, column: str, value: str) -> int:
+        """Code of a level given by its label (any case) or by its code."""
+        labels = self.levels[column]
+        value = value.strip("'\"")
+        by_label = casefold_map({label: i for i, label in enumerate(labels)})
+        if value.casefold() in by_label:
+            return by_label[value.casefold()]
+        if value.isdigit() and int(value) < len(labels):
+            return int(value)
+        raise QueryError(f"{column} has no level {value!r} (levels: {', '.join(labels)})")
+
+    def categorical_term(self, column: str, op: str, value: str) -> int:
+        if op == "in":
+            codes = {self.code(column, v) for v in split_outside(value.strip("()[]"), COMMA)}
+        else:
+            # levels are ordered, so <, > compare ordinal codes (movable >= Maybe)
+            code = self.code(column, value)
+            codes = {c for c in range(len(self.levels[column])) if {
+                "==": c == code, "!=": c != code, "<": c < code, "<=": c <= code, ">": c > code, ">=": c >= code,
+            }[op]}
+        result = 0
+        for c in codes:
+            result |= self.bitmap(column, c)
+        return result
+
+    def numeric_term(self, column: str, op: str, value: str) -> int:
+        import numpy as np
+        try:
+            v = float(value)
+        except ValueError:
+            raise QueryError(f"{column} is numeric, got {value!r}")
+        values, rows = self.sorted_values[column], self.sorted_rows[column]
+        lo, hi = np.searchsorted(values, v, side="left"), np.searchsorted(values, v, side="right")
+        if op == "!=":
+            return self.rows_bitmap(np.concatenate([rows[:lo], rows[hi:]]))
+        selected = {"==": rows[lo:hi], "<": rows[:lo], "<=": rows[:hi], ">": rows[hi:], ">=": rows[lo:]}[op]
+        return self.rows_bitmap(selected)
+
+    def term(self, text: str) -> int:
+        m = TERM.match(text)
+        if not m:
+            raise QueryError(f"cannot parse {text!r}, expected `column op value`")
+        column, op, value = m.groups()
+        if column in self.levels:
+            return self.categorical_term(column, op, value)
+        if column in self.sorted_rows:
+            if op == "in":
+                raise QueryError(f"`in` needs a qualitative column, {column} is numeric")
+            return self.numeric_term(column, op, value)
+        raise QueryError(f"unknown column {column!r} (columns: {', '.join([*self.levels, *self.sorted_rows])})")
+
+    def filter(self, query: str = "") -> int:
+        """Bitmap of the rows matching every `column op value` term joined by `and`."""
+        result = self.all
+        for text in split_outside(query.strip(), AND):
+            result &= self.term(text)
+        return result
+
+    def group_counts(self, column: str, bitmap: int | None = None) -> dict[str, int]:
+        if column not in self.levels:
+            raise QueryError(f"cannot group by {column!r} (qualitative columns: {', '.join(self.levels)})")
+        bitmap = self.all if bitmap is None else bitmap
+        return {label: (bitmap & self.bitmap(column, code)).bit_count() for code, label in enumerate(self.levels[column])}
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Per-cluster PCA
+---------------
+
+Internal structure of every k-means cluster: a local PCA of its blocks, on the
+features standardized with the fitted scaler (kmeans_model.npz), so that the
+clusters' axes and variances are in the same units as the global ACP.
+
+The standardized matrix is sorted by label once (one stable sort, so that
+every cluster is a contiguous range of rows), published in shared memory
+(common/shared_matrix.py) and the clusters are decomposed in worker processes,
+largest first: a worker receives the handle of the matrix and the bounds of
+its cluster, not a pickled copy of the rows. A local PCA is the eigendecomposition of the d x d
+covariance of its cluster: all of them together take one pass over the
+n x d matrix, about the cost of a single global PCA.
+
+cluster_pca.csv has one row per cluster and component: the cluster size and
+total variance, the component's eigenvalue, its share of the cluster's
+variance (explained_ratio, cumulative_ratio), then its loading on every
+feature (signs fixed so that the largest loading is positive). A cluster of a
+single block has no variance: its eigenvalues and ratios are 0.
+
+Usage:
+  python cluster_pca.py
+  python cluster_pca.py --components 3 --jobs 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from const import PathCsvClusterPca, PathCsvWithClusters, PathKmeansModel
+from quality import load_standardized, write_csv
+import resources
+from shared_matrix import MatrixHandle, SharedMatrix, attach
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def split_by_label(X: np.ndarray, labels: np.ndarray) -> tuple[np.ndarray, list[tuple[int, int, int]]]:
+    """X reordered by label, and the (label, start, stop) rows of every cluster in it."""
+    import numpy as np
+    order = np.argsort(labels, kind="stable")
+    clusters, starts, counts = np.unique(labels[order], return_index=True, return_counts=True)
+    return X[order], [(int(c), int(s), int(s + k)) for c, s, k in zip(clusters, starts, counts)]
+
+
+def local_pca(X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Eigenvalues of the covariance of X, decreasing, and the loadings (one row per component)."""
+    import numpy as np
+    n, d = X.shape
+    if n < 2:
+        return np.zeros(d), np.eye(d)
+    centered = X - X.mean(axis=0)
+    eigenvalues, vectors = np.linalg.eigh(centered.T @ centered / (n - 1))
+    order = eigenvalues.argsort()[::-1]
+    eigenvalues, loadings = np.maximum(eigenvalues[order], 0.0), vectors[:, order].T
+    # an eigenvector is only defined up to its sign: make its largest loading positive
+    signs = np.sign(loadings[np.arange(d), np.abs(loadings).argmax(axis=1)])
+    signs[signs == 0] = 1.0
+    return eigenvalues, loadings * signs[:, None]
+
+
+def local_pca_shared(handle: MatrixHandle, start: int, stop: int) -> tuple[np.ndarray, np.ndarray]:
+    # worker side: the rows are read from the matrix published by the driver
+    X, _ = attach(handle)
+    return local_pca(X[start:stop])
+
+
+def decompose(Xs: np.ndarray, parts: list[tuple[int, int, int]], jobs: int = 1,
+              threads: int = 1) -> dict[int, tuple[np.ndarray, np.ndarray]]:
+    """Local PCA of every (label, start, stop) part of the sorted matrix Xs, in `jobs` processes."""
+    # largest clusters first, so that a big one does not start last and finish alone
+    parts = sorted(parts, key=lambda part: part[1] - part[2])
+    if jobs <= 1 or len(parts) < 2:
+        return {label: local_pca(Xs[start:stop]) for label, start, stop in parts}
+    with SharedMatrix(Xs) as shared, ProcessPoolExecutor(max_workers=min(jobs, len(parts)),
+                                                         initializer=resources.worker_init,
+                                                         initargs=(threads,)) as pool:
+        futures = {label: pool.submit(local_pca_shared, shared.handle, start, stop) for label, start, stop in parts}
+        return {label: future.result() for label, future in futures.items()}
+
+
+def report_rows(parts: list[tuple[int, int, int]], results: dict[int, tuple[np.ndarray, np.ndarray]],
+                features: list[str], components: int | None = None) -> list[dict]:
+    import numpy as np
+    rows = []
+    for label, start, stop in parts:
+        eigenvalues, loadings = results[label]
+        total = float(eigenvalues.sum())
+        ratios = eigenvalues / total if total > 0 else np.zeros_like(eigenvalues)
+        cumulative = np.cumsum(ratios)
+        for i in range(min(components or len(eigenvalues), len(eigenvalues))):
+            rows.append({"cluster": label, "size": stop - start, "total_variance": total, "component": f"PC{i + 1}",
+                         "eigenvalue": float(eigenvalues[i]), "explained_ratio": float(ratios[i]),
+                         "cumulative_ratio": float(cumulative[i])}
+                        | {f: float(w) for f, w in zip(features, loadings[i])})
+    return rows
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Local PCA of every k-means cluster, in parallel.")
+    p.add_argument("--input", type=Path, default=PathCsvWithClusters, help="Encoded table with a cluster column")
+    p.add_argument("--model", type=Path, default=PathKmeansModel, help="Scaler of the fit (default: kmeans_model.npz)")
+    p.add_argument("--components", type=int, default=None, help="Components reported per cluster (default: all)")
+    resources.add_arguments(p, jobs_help="Processes running the cluster PCAs", jobs_default="CPU count")
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    alloc = resources.configure(args.jobs, args.threads, default_jobs=resources.available_cores()[0])
+    if not args.input.exists():
+        import kmeans
+        kmeans.kmeans(kmeans.Config())
+
+    _, features, Xstd, labels = load_standardized(args.input, args.model)
+    start = time.perf_counter()
+    Xs, parts = split_by_label(Xstd, labels)
+    results = decompose(Xs, parts, alloc.jobs, alloc.threads)
+    print(f"[INFO] Local PCA of {len(parts)} clusters ({len(Xstd)} blocks, {len(features)} features) "
+          f"in {time.perf_counter() - start:.2f} s")
+    write_csv(PathCsvClusterPca, report_rows(parts, results, features, args.components))
+    for label, start, stop in parts:
+        eigenvalues, loadings = results[label]
+        total = eigenvalues.sum()
+        if total > 0:
+            top = features[int(abs(loadings[0]).argmax())]
+            print(f"  cluster {label:<3} {stop - start:>8} blocks  PC1 {eigenvalues[0] / total:6.1%} of {total:.3g} (mostly {top})")
+        else:
+            print(f"  cluster {label:<3} {stop - start:>8} blocks  no variance")
+
+
+if __name__ == "__main__":
+    main()
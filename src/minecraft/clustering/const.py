@@ -1,17 +1,35 @@
 # Encodings
+import os
+import sys
 from pathlib import Path
 
+# Modules shared with the other analyses (dataset schema, ...)
+COMMON_DIR = Path(__file__).resolve().parent.parent / 'common'
+if str(COMMON_DIR) not in sys.path:
+    sys.path.append(str(COMMON_DIR))
+
 
 def casefold_map(d: dict[str, int]) -> dict[str, int]:
     return {k.casefold(): v for k, v in d.items()}
 
 
-outdir = Path(__file__).parent / 'results'
-outdir.mkdir(exist_ok=True)
+# MC_CLUSTERING_RESULTS lets the pipeline point a run at another results directory
+outdir = Path(os.environ.get('MC_CLUSTERING_RESULTS', Path(__file__).parent / 'results'))
+outdir.mkdir(parents=True, exist_ok=True)
 PathCsvClean = outdir / 'clean.csv'
 PathCsvClusterProfiles = outdir / 'cluster_profiles.csv'
 PathPlotKdiag = outdir / 'kdiag.png'
 PathCsvWithClusters = outdir / 'data_with_clusters.csv'
+PathKmeansModel = outdir / 'kmeans_model.npz'
+PathGridCache = outdir / 'grid_cache'
+PathCsvGridResults = outdir / 'grid_results.csv'
+PathCsvClusterQuality = outdir / 'cluster_quality.csv'
+PathCsvQualitySummary = outdir / 'cluster_quality_summary.csv'
+PathCsvBlockSilhouette = outdir / 'block_silhouette.csv'
+PathCsvHierarchicalClusters = outdir / 'hierarchical_clusters.csv'
+PathCsvCoresetReport = outdir / 'coreset_report.csv'
+PathCsvClusterPca = outdir / 'cluster_pca.csv'
+PathDistanceCache = outdir / 'distance_cache'
 PathPlotCustersPca = outdir / "clusters_pca.png"
 PathPlotDendogram = outdir / "dendogram.png"
 PathClusterSizes = outdir / "clusters_sizes.png"
@@ -0,0 +1,113 @@
+"""
+Lightweight coreset for k-means
+-------------------------------
+
+On millions of blocks, k-means with n_init restarts costs O(n k d) per
+iteration and restart. A lightweight coreset (Bachem, Lucic & Krause, 2018)
+replaces the table by m weighted rows, sampled with probability
+
+    q(x) = 1/(2n) + d(x, mean)² / (2 Σ d(x', mean)²)
+
+and weighted 1 / (m q(x)). With m = O((d k log k + log 1/δ) / ε²) rows, with
+probability 1 - δ the weighted cost of *any* k centers Q on the coreset is
+within ε/2 cost(X, Q) + ε/2 cost(X, {mean}) of their cost on the full table,
+whatever n is. Sampling needs two passes over the rows and no distance to
+anything but the mean.
+
+k-means is fitted on the coreset (sample weights), then every block is
+assigned to its nearest center in batches of rows, which also gives the true
+inertia on the full table. The report measures what was given up:
+
+- coreset_cost_error: relative gap between the coreset's estimate of the
+  inertia and the true inertia of the same centers;
+- sample_gap: on a uniform sample of blocks, inertia of the coreset centers
+  relative to a full k-means fit on that sample (0 = as good as a full fit).
+
+    centers, labels, report = fit(Xstd, cfg, m=20_000)
+"""
+
+from __future__ import annotations
+
+import csv
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+    from sklearn.cluster import KMeans
+    from kmeans import Config
+
+# rows whose distances to the centers are computed at once when assigning
+ASSIGN_BATCH = 65_536
+# uniform sample the coreset fit is compared against
+GAP_SAMPLE = 20_000
+
+
+def lightweight_coreset(X: np.ndarray, m: int, random_state: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(rows, weights, row indices) of a lightweight coreset of m rows; weights sum to n in expectation."""
+    import numpy as np
+    rng = np.random.default_rng(random_state)
+    n = len(X)
+    mean = X.mean(axis=0)
+    d2 = np.empty(n)
+    for start in range(0, n, ASSIGN_BATCH):
+        diff = X[start:start + ASSIGN_BATCH] - mean
+        d2[start:start + ASSIGN_BATCH] = np.einsum("ij,ij->i", diff, diff)
+    total = d2.sum()
+    q = 0.5 / n + (0.5 * d2 / total if total > 0 else 0.5 / n)
+    idx = rng.choice(n, size=m, replace=True, p=q / q.sum())
+    return X[idx], 1.0 / (m * q[idx]), idx
+
+
+def assign(X: np.ndarray, centers: np.ndarray) -> tuple[np.ndarray, float]:
+    """Nearest center of every row and the total squared distance, ASSIGN_BATCH rows at a time."""
+    import numpy as np
+    centers = np.asarray(centers, dtype=float)
+    csq = np.einsum("ij,ij->i", centers, centers)
+    labels = np.empty(len(X), dtype=np.int32)
+    inertia = 0.0
+    for start in range(0, len(X), ASSIGN_BATCH):
+        batch = np.asarray(X[start:start + ASSIGN_BATCH], dtype=float)
+        d2 = np.einsum("ij,ij->i", batch, batch)[:, None] - 2.0 * (batch @ centers.T) + csq
+        labels[start:start + len(batch)] = d2.argmin(axis=1)
+        inertia += float(np.maximum(d2.min(axis=1), 0.0).sum())
+    return labels, inertia
+
+
+def fit(X: np.ndarray, cfg: Config, m: int) -> tuple[KMeans, np.ndarray, list[dict]]:
+    """k-means fitted on a coreset of m rows, the label of every row, and the approximation report."""
+    import numpy as np
+    from kmeans import create_model
+    points, weights, _ = lightweight_coreset(X, m, cfg.random_state)
+    print(f"[INFO] Coreset: {len(X)} blocks summarized by {m} weighted rows")
+    model = create_model(points, cfg, sample_weight=weights)
+    labels, inertia = assign(X, model.cluster_centers_)
+    estimate = float(model.inertia_)
+
+    # a full fit is affordable on a uniform sample: compare both center sets there
+    rng = np.random.default_rng(cfg.random_state + 1)
+    sample = X[np.sort(rng.choice(len(X), size=min(GAP_SAMPLE, len(X)), replace=False))]
+    full = create_model(sample, cfg)
+    _, coreset_on_sample = assign(sample, model.cluster_centers_)
+    report = [
+        {"metric": "rows", "value": len(X)},
+        {"metric": "coreset_rows", "value": m},
+        {"metric": "inertia", "value": inertia},
+        {"metric": "coreset_inertia_estimate", "value": estimate},
+        {"metric": "coreset_cost_error", "value": abs(estimate - inertia) / inertia if inertia > 0 else 0.0},
+        {"metric": "sample_rows", "value": len(sample)},
+        {"metric": "sample_inertia_full_fit", "value": float(full.inertia_)},
+        {"metric": "sample_inertia_coreset_centers", "value": coreset_on_sample},
+        {"metric": "sample_gap", "value": coreset_on_sample / full.inertia_ - 1 if full.inertia_ > 0 else 0.0},
+    ]
+    return model, labels, report
+
+
+def write_report(path: Path, report: list[dict]):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["metric", "value"], delimiter=";")
+        writer.writeheader()
+        writer.writerows(report)
+    print(f"[INFO] Wrote {path}")
+    for row in report:
+        print(f"  {row['metric']:<32} {row['value']:.6g}")
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+K-means grid search
+-------------------
+
+Fits k-means for every combination of k x seed x init x algorithm x n_init on
+the standardized clean dataset and scores each fit (inertia, silhouette,
+Davies-Bouldin, Calinski-Harabasz).
+
+Every fit is cached on disk under results/grid_cache/<data hash>/, one .npz per
+configuration (labels, centers, metrics), written atomically. Configurations
+already in the cache for the current data are not refitted, so an interrupted
+search resumes where it stopped, and widening the grid only fits the new
+combinations. Changing the dataset changes the data hash and starts a new cache.
+
+Outputs:
+- grid_results.csv (one row per configuration of the grid)
+
+Usage:
+  python grid_search.py --k 2-12 --seeds 0-4 --init k-means++,random --jobs 4
+  python grid_search.py --k 7 --algorithm lloyd,elkan --n_init 1,10
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import importdata
+
+from const import PathCsvClean, PathCsvGridResults, PathGridCache
+import column_stats
+from kmeans import Config, create_model, load_data, standardize
+import resources
+from shared_matrix import MatrixHandle, SharedMatrix, attach
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Config fields that define a fit; `compact` only changes the input dtype, which is part of the data hash
+GRID_FIELDS = ("k", "random_state", "n_init", "init", "algorithm")
+METRICS = ("inertia", "silhouette", "davies_bouldin", "calinski_harabasz", "n_iter", "fit_seconds")
+# temporary files older than this were left by a killed run (a fit is written within seconds)
+STALE_TMP_SECONDS = 3600
+
+
+def int_list(text: str) -> list[int]:
+    """'2-5,8' -> [2, 3, 4, 5, 8]"""
+    values = []
+    for part in text.split(","):
+        lo, _, hi = part.partition("-")
+        values.extend(range(int(lo), int(hi or lo) + 1))
+    return values
+
+
+def str_list(text: str) -> list[str]:
+    return [v.strip() for v in text.split(",") if v.strip()]
+
+
+def data_hash(features: list[str], Xstd: np.ndarray) -> str:
+    h = hashlib.sha256()
+    h.update(json.dumps([features, str(Xstd.dtype), Xstd.shape]).encode())
+    h.update(Xstd.tobytes(order="C"))
+    return h.hexdigest()[:16]
+
+
+def config_params(cfg: Config) -> dict:
+    return {f: getattr(cfg, f) for f in GRID_FIELDS}
+
+
+def config_key(cfg: Config) -> str:
+    return hashlib.sha256(json.dumps(config_params(cfg), sort_keys=True).encode()).hexdigest()[:16]
+
+
+class ResultCache:
+    """Fits of one dataset, one .npz per configuration."""
+
+    def __init__(self, root: Path, data_key: str):
+        self.dir = root / data_key
+
+    def path(self, cfg: Config) -> Path:
+        return self.dir / f"{config_key(cfg)}.npz"
+
+    def metrics(self, cfg: Config) -> dict | None:
+        import numpy as np
+        path = self.path(cfg)
+        if not path.exists():
+            return None
+        with np.load(path) as f:
+            return json.loads(str(f["metrics"]))
+
+    def labels(self, cfg: Config) -> np.ndarray:
+        import numpy as np
+        with np.load(self.path(cfg)) as f:
+            return f["labels"]
+
+    def put(self, cfg: Config, labels: np.ndarray, centers: np.ndarray, metrics: dict):
+        import numpy as np
+        self.dir.mkdir(parents=True, exist_ok=True)
+        path = self.path(cfg)
+        # written next to the final file then renamed: a killed run never leaves a truncated entry
+        tmp = path.with_name(f".{path.stem}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, labels=labels, centers=centers, metrics=np.array(json.dumps(metrics)))
+        os.replace(tmp, path)
+
+    def remove_partial(self, older_than: float = STALE_TMP_SECONDS):
+        """Remove the temporary files left by killed runs, not those of another run writing to the same cache."""
+        cutoff = time.time() - older_than
+        for tmp in self.dir.glob(".*.tmp"):
+            try:
+                if tmp.stat().st_mtime < cutoff:
+                    tmp.unlink()
+            except FileNotFoundError:
+                pass
+
+
+# ---- worker side ----
+
+_Xstd: np.ndarray | None = None
+
+
+def set_matrix(Xstd: np.ndarray):
+    global _Xstd
+    _Xstd = Xstd
+
+
+def init_worker(handle: MatrixHandle, threads: int):
+    # attaches to the matrix published by the driver: no copy per worker
+    resources.worker_init(threads)
+    set_matrix(attach(handle)[0])
+
+
+def evaluate(cfg: Config, cache: ResultCache) -> dict:
+    from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score, silhouette_score
+    start = time.perf_counter()
+    model = create_model(_Xstd, cfg)
+    elapsed = time.perf_counter() - start
+    labels = model.labels_
+    # the scores need at least 2 distinct clusters (a fit can collapse to fewer than k)
+    scored = 1 < len(set(labels.tolist())) < len(labels)
+    metrics = config_params(cfg) | {
+        "inertia": float(model.inertia_),
+        "silhouette": float(silhouette_score(_Xstd, labels)) if scored else None,
+        "davies_bouldin": float(davies_bouldin_score(_Xstd, labels)) if scored else None,
+        "calinski_harabasz": float(calinski_harabasz_score(_Xstd, labels)) if scored else None,
+        "n_iter": int(model.n_iter_),
+        "fit_seconds": round(elapsed, 4),
+    }
+    cache.put(cfg, labels, model.cluster_centers_, metrics)
+    return metrics
+
+
+# ---- driver ----
+
+def grid(args) -> list[Config]:
+    return [Config(k=k, random_state=seed, n_init=n_init, init=init, algorithm=algorithm, compact=args.compact)
+            for k, seed, n_init, init, algorithm
+            in itertools.product(args.k, args.seeds, args.n_init, args.init, args.algorithm)]
+
+
+def write_results(path: Path, rows: list[dict]):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=[*GRID_FIELDS, *METRICS], delimiter=";")
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Cached, resumable k-means hyper-parameter search.")
+    p.add_argument("--k", type=int_list, default=int_list("2-12"), help="Cluster counts, e.g. 2-12 or 4,6,8 (default: 2-12)")
+    p.add_argument("--seeds", type=int_list, default=[42], help="Random seeds, e.g. 0-9 (default: 42)")
+    p.add_argument("--n_init", type=int_list, default=[10], help="n_init values (default: 10)")
+    p.add_argument("--init", type=str_list, default=["k-means++"], help="Initializations: k-means++,random (default: k-means++)")
+    p.add_argument("--algorithm", type=str_list, default=["lloyd"], help="Algorithms: lloyd,elkan (default: lloyd)")
+    resources.add_arguments(p, jobs_help="Worker processes, one fit each", jobs_default="CPU count")
+    p.add_argument("--cache", type=Path, default=PathGridCache, help=f"Result cache directory (default: {PathGridCache})")
+    p.add_argument("--out", type=Path, default=PathCsvGridResults, help=f"Results table (default: {PathCsvGridResults})")
+    p.add_argument("--compact", action="store_true", help="Fit on float32 features (cached separately)")
+    p.add_argument("--refit", action="store_true", help="Ignore cached results and refit every configuration")
+    return p.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    # one fit per core by default: k-means on this table gains more from parallel fits than from threads
+    alloc = resources.configure(args.jobs, args.threads, default_jobs=resources.available_cores()[0])
+    for init in args.init:
+        if init not in ("k-means++", "random"):
+            raise SystemExit(f"Unknown init {init!r}")
+    for algorithm in args.algorithm:
+        if algorithm not in ("lloyd", "elkan"):
+            raise SystemExit(f"Unknown algorithm {algorithm!r}")
+
+    if not PathCsvClean.exists():
+        importdata.importdata()
+    blocks, X = load_data(PathCsvClean, args.compact)
+    _, Xstd = standardize(X, args.compact, column_stats.load(PathCsvClean))
+    cache = ResultCache(args.cache, data_hash(list(X.columns), Xstd))
+    cache.remove_partial()
+
+    configs = grid(args)
+    results = {} if args.refit else {config_key(c): m for c in configs if (m := cache.metrics(c)) is not None}
+    todo = [c for c in configs if config_key(c) not in results]
+    print(f"[INFO] {len(configs)} configurations, {len(results)} cached in {cache.dir}, {len(todo)} to fit")
+
+    interrupted = False
+    start = time.perf_counter()
+    try:
+        if alloc.jobs <= 1 or len(todo) <= 1:
+            set_matrix(Xstd)
+            for i, cfg in enumerate(todo, 1):
+                results[config_key(cfg)] = evaluate(cfg, cache)
+                print(f"[{i}/{len(todo)}] {config_params(cfg)}")
+        else:
+            with SharedMatrix(Xstd, blocks) as shared, \
+                    ProcessPoolExecutor(max_workers=alloc.jobs, initializer=init_worker,
+                                        initargs=(shared.handle, alloc.threads)) as pool:
+                # only a few fits are queued at a time, so an interruption waits for those alone
+                queue = iter(todo)
+                running = {pool.submit(evaluate, cfg, cache): cfg for cfg in itertools.islice(queue, 2 * alloc.jobs)}
+                done_count = 0
+                while running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        cfg = running.pop(future)
+                        results[config_key(cfg)] = future.result()
+                        done_count += 1
+                        print(f"[{done_count}/{len(todo)}] {config_params(cfg)}")
+                        if (nxt := next(queue, None)) is not None:
+                            running[pool.submit(evaluate, nxt, cache)] = nxt
+    except KeyboardInterrupt:
+        interrupted = True
+        print("\n[INFO] Interrupted; finished fits are cached, run the same command again to resume")
+    if todo:
+        print(f"[INFO] Fitted in {time.perf_counter() - start:.1f}s")
+
+    rows = [results[config_key(c)] for c in configs if config_key(c) in results]
+    write_results(args.out, rows)
+    print(f"[INFO] Wrote {args.out}")
+    scored = [r for r in rows if r["silhouette"] is not None]
+    if scored:
+        best = max(scored, key=lambda r: r["silhouette"])
+        print(f"[INFO] Best silhouette {best['silhouette']:.4f}: { {f: best[f] for f in GRID_FIELDS} }")
+    return 130 if interrupted else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+"""
+Hybrid hierarchical clustering
+------------------------------
+
+Ward's agglomerative clustering needs all pairwise distances between blocks,
+O(n²) memory and time. The hybrid mode first summarizes the blocks into a few
+hundred k-means micro-clusters, then runs Ward on their centroids, each
+weighted by its number of blocks, so the tree costs O(m³) for m micro-clusters
+whatever n is.
+
+A micro-cluster of weight w is treated as w blocks sitting on its centroid:
+the Ward cost of merging A and B is then sqrt(2 wA wB / (wA + wB)) ||cA - cB||,
+the same as scipy's `ward` linkage, and the linkage matrix can be passed to
+scipy's `dendrogram` and `fcluster` as usual. Its count column holds numbers
+of micro-clusters, as scipy expects; `node_sizes` gives numbers of blocks.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def micro_clusters(X: np.ndarray, m: int, random_state: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(centroids, weights, label of every row) of at most m micro-clusters."""
+    import numpy as np
+    from sklearn.cluster import MiniBatchKMeans
+    m = min(m, len(X))
+    model = MiniBatchKMeans(n_clusters=m, batch_size=4096, n_init=3, random_state=random_state).fit(X)
+    labels = model.labels_
+    weights = np.bincount(labels, minlength=m).astype(float)
+    # micro-clusters left empty by the mini-batches carry no block: drop them and renumber
+    kept = np.flatnonzero(weights > 0)
+    renumber = np.full(m, -1)
+    renumber[kept] = np.arange(len(kept))
+    return model.cluster_centers_[kept], weights[kept], renumber[labels]
+
+
+def weighted_ward(centers: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Ward linkage matrix (scipy format) of weighted points."""
+    import numpy as np
+    m = len(centers)
+    C = np.asarray(centers, dtype=float).copy()
+    W = np.asarray(weights, dtype=float).copy()
+    leaves = np.ones(m)
+    ids = np.arange(m)
+    active = np.ones(m, dtype=bool)
+
+    def costs(i: int) -> np.ndarray:
+        d = np.sqrt(2 * W[i] * W / (W[i] + W)) * np.linalg.norm(C - C[i], axis=1)
+        d[~active] = np.inf
+        d[i] = np.inf
+        return d
+
+    D = np.full((m, m), np.inf)
+    for i in range(m):
+        D[i] = costs(i)
+    Z = np.empty((m - 1, 4))
+    for step in range(m - 1):
+        i, j = divmod(int(np.argmin(D)), m)
+        Z[step] = [min(ids[i], ids[j]), max(ids[i], ids[j]), D[i, j], leaves[i] + leaves[j]]
+        # j is merged into i, which takes the merged centroid and the new cluster id
+        C[i] = (W[i] * C[i] + W[j] * C[j]) / (W[i] + W[j])
+        W[i] += W[j]
+        leaves[i] += leaves[j]
+        ids[i] = m + step
+        active[j] = False
+        D[j, :] = D[:, j] = np.inf
+        D[i] = D[:, i] = costs(i)
+    return Z
+
+
+def node_sizes(Z: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Number of blocks under every node of the tree: leaves first, then merges in order."""
+    import numpy as np
+    sizes = np.concatenate([np.asarray(weights, dtype=float), np.empty(len(Z))])
+    m = len(weights)
+    for step, (a, b) in enumerate(Z[:, :2].astype(int)):
+        sizes[m + step] = sizes[a] + sizes[b]
+    return sizes
+
+
+def cut(Z: np.ndarray, k: int) -> np.ndarray:
+    """Cluster (0..k-1) of every leaf when the tree is cut into k clusters."""
+    from scipy.cluster.hierarchy import fcluster
+    return fcluster(Z, t=k, criterion="maxclust") - 1
@@ -5,29 +5,32 @@ importdata.py
 
 Lit un CSV de blocs Minecraft (CSV distant ou local),
 encode les variables qualitatives, centre-réduit les variables numériques,
-et écrit un fichier normalisé dans results/.
+et écrit un fichier normalisé dans results/, avec ses statistiques par colonne
+(clean.csv.stats.json, voir common/column_stats.py).
 """
 
+from __future__ import annotations
+
+import argparse
 from pathlib import Path
-import pandas as pd
+from typing import TYPE_CHECKING
 
 from const import PathCsvClean
+from alloc_tracking import AllocTracker
+from column_stats import ColumnStats
+import schema
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Constantes
 path_csv_raw = Path(__file__).parent.parent.parent.parent / "datasets" / "minecraft" / "blocks" / "blocklist_clean.csv"
 
-# Encodages
-MAP_CONDUCTIVE = {"No": 0, "Maybe": 1, "Yes": 2}
-MAP_FULL_CUBE = {"No": 0, "Maybe": 1, "Yes": 2}
-MAP_MOVABLE = {"No": 0, "Breaks": 1, "Maybe": 2, "Yes": 3}
-MAP_SPAWNABLE = {
-    "No": 0,
-    "Fire-Immune Mobs Only": 1,
-    "Ocelots and Parrots Only": 2,
-    "Polar Bear Only": 3,
-    "Maybe": 4,
-    "Yes": 5,
-}
+# Encodages (ordre des modalités déclaré dans common/schema.py)
+MAP_CONDUCTIVE = schema.codes("conductive")  # No, Maybe, Yes
+MAP_FULL_CUBE = schema.codes("full_cube")  # No, Maybe, Yes
+MAP_MOVABLE = schema.codes("movable")  # No, Breaks, Maybe, Yes
+MAP_SPAWNABLE = schema.codes("spawnable")  # No, Fire-Immune Mobs Only, Ocelots and Parrots Only, Polar Bear Only, Maybe, Yes
 
 NUMERIC_COLS = [
     "number_of_variants",
@@ -44,23 +47,46 @@ ALL_FEATURES = NUMERIC_COLS + QUALI_COLS
 
 
 def load_data(path: Path) -> pd.DataFrame:
-    df = pd.read_csv(path, sep=";")
-    return df
+    return schema.read_clean(path)
 
 
-def encode(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
+# inplace : encode les colonnes du DataFrame reçu au lieu d'en copier toutes les colonnes
+def encode(df: pd.DataFrame, inplace: bool = False) -> pd.DataFrame:
+    if not inplace:
+        df = df.copy()
     df["conductive"] = df["conductive"].map(MAP_CONDUCTIVE)
     df["full_cube"] = df["full_cube"].map(MAP_FULL_CUBE)
     df["movable"] = df["movable"].map(MAP_MOVABLE)
     df["spawnable"] = df["spawnable"].map(MAP_SPAWNABLE)
     return df
 
-def importdata():
-    df = load_data(path_csv_raw)
-    df_enc = encode(df)
-    df_enc.to_csv(PathCsvClean, sep=";", index=False)
-    print(f"[INFO] Fichier propre écrit dans {PathCsvClean}")
+def importdata(path_in: Path = path_csv_raw, path_out: Path = PathCsvClean, low_alloc: bool = False,
+               tracker: AllocTracker | None = None):
+    tracker = tracker or AllocTracker(enabled=False)
+    with tracker.stage("load"):
+        df = load_data(path_in)
+    # les statistiques portent sur les modalités : calculées avant l'encodage, qui peut se faire en place
+    stats = ColumnStats(schema.NUMERIC_COLUMNS, schema.CATEGORICAL_COLUMNS, exact_median=True)
+    with tracker.stage("stats"):
+        stats.update(df)
+    with tracker.stage("encode"):
+        df_enc = encode(df, inplace=low_alloc)
+    with tracker.stage("write"):
+        df_enc.to_csv(path_out, sep=";", index=False)
+    print(f"[INFO] Fichier propre écrit dans {path_out}")
+    print(f"[INFO] Statistiques écrites dans {stats.save(path_out, encoded=True)}")
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Encode les variables qualitatives du CSV de blocs.")
+    p.add_argument("--input", type=Path, default=path_csv_raw, help=f"CSV source (défaut : {path_csv_raw})")
+    p.add_argument("--output", type=Path, default=PathCsvClean, help=f"CSV encodé (défaut : {PathCsvClean})")
+    p.add_argument("--low-alloc", action="store_true", help="Encode le tableau en place au lieu d'en faire une copie")
+    p.add_argument("--alloc-report", action="store_true", help="Affiche la mémoire allouée par chaque étape (tracemalloc)")
+    return p.parse_args()
 
 if __name__ == "__main__":
-    importdata()
\ No newline at end of file
+    args = parse_args()
+    tracker = AllocTracker(enabled=args.alloc_report, label="low-alloc" if args.low_alloc else "default",
+                           preload=("pandas",))
+    importdata(args.input, args.output, low_alloc=args.low_alloc, tracker=tracker)
+    tracker.report()
@@ -9,7 +9,10 @@ to a quantitative scale, scales features, and runs k-means clustering.
 
 Outputs:
 - with_clusters.csv  (original data + cluster label)
-- cluster_profiles.csv (cluster-wise feature averages)
+- cluster_profiles.csv (cluster-wise feature means, spread and quantiles)
+- hierarchical_clusters.csv (Ward tree cut at k, exact or on micro-clusters)
+- coreset_report.csv (when fitted on a coreset: approximation gap)
+- dendogram.png
 - kdiag.png (optional: inertia/silhouette plots if --plots)
 
 Usage:
@@ -17,52 +20,94 @@ Usage:
   python mc_blocks_kmeans.py --csv blocklist_clean.csv --k 6
 """
 
+from __future__ import annotations
+
 import argparse
 from dataclasses import dataclass
 import sys
 from pathlib import Path
-import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
-from sklearn.cluster import AgglomerativeClustering
-from scipy.cluster.hierarchy import dendrogram
+from typing import TYPE_CHECKING
 
 import importdata
 
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
+from alloc_tracking import AllocTracker
+from const import PathCsvClusterProfiles, PathCsvClean, PathCsvCoresetReport, PathCsvHierarchicalClusters, PathCsvWithClusters, PathDistanceCache, PathKmeansModel, PathPlotDendogram, PathPlotKdiag
+import column_stats
+from distance_cache import DEFAULT_MAX_MB
+from profiles import cluster_profiles
+import resources
+import schema
 
-from const import PathCsvClusterProfiles, PathCsvClean, PathCsvWithClusters, PathPlotDendogram, PathPlotKdiag
+# numpy, pandas, sklearn, scipy and matplotlib are imported where they are used,
+# so that --help and the scripts importing this module start instantly
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    from sklearn.cluster import KMeans
+    from sklearn.preprocessing import StandardScaler
+    from column_stats import TableStats
 
 type MatrixLike = np.ndarray | pd.DataFrame
 
+# the exact Ward tree needs O(n²) memory: beyond this many blocks, --hierarchy auto goes hybrid
+# (distance_cache.DEFAULT_MAX_MB fits the distances of this many blocks)
+HYBRID_MIN_ROWS = 20_000
+# beyond this many blocks, k-means is fitted on a coreset of CORESET_ROWS weighted rows unless --coreset 0
+CORESET_MIN_ROWS = 1_000_000
+CORESET_ROWS = 20_000
+
 @dataclass
 class Config:
     k: int = 7
     random_state: int = 42
+    n_init: int = 10
+    init: str = "k-means++"
+    algorithm: str = "lloyd"
+    compact: bool = False
+    hierarchy: str = "auto"
+    micro_clusters: int = 300
+    distance_cache: bool = True
+    distance_cache_mb: float = DEFAULT_MAX_MB
+    coreset: int | None = None
+    low_alloc: bool = False
+    alloc_report: bool = False
 
 def parse_args():
     p = argparse.ArgumentParser(description="K-means clustering for Minecraft blocks.")
     p.add_argument("--k", default=7, type=int, help="Number of clusters (int) or 'auto' to search (default: auto)")
     p.add_argument("--random_state", type=int, default=42, help="Random seed (default: 42)")
-    return Config(**vars(p.parse_args()))
-
-def to_numeric(df: pd.DataFrame) -> pd.DataFrame:
-    for c in df.columns:
-        df[c] = pd.to_numeric(df[c], errors="raise")
-    return df
+    p.add_argument("--n_init", type=int, default=10, help="Number of k-means runs, the best one is kept (default: 10)")
+    p.add_argument("--init", choices=["k-means++", "random"], default="k-means++", help="Centroid initialization (default: k-means++)")
+    p.add_argument("--algorithm", choices=["lloyd", "elkan"], default="lloyd", help="K-means algorithm (default: lloyd)")
+    p.add_argument("--compact", action="store_true", help="Load codes as int8 and features as float32 (default: float64)")
+    p.add_argument("--hierarchy", choices=["auto", "exact", "hybrid"], default="auto",
+                   help=f"Ward tree on every block (exact) or on k-means micro-clusters (hybrid); auto uses hybrid above {HYBRID_MIN_ROWS} blocks")
+    p.add_argument("--micro_clusters", type=int, default=300, help="Micro-clusters of the hybrid hierarchy (default: 300)")
+    p.add_argument("--no_distance_cache", dest="distance_cache", action="store_false",
+                   help="Do not keep the pairwise distances of the exact hierarchy for quality.py")
+    p.add_argument("--distance_cache_mb", type=float, default=DEFAULT_MAX_MB,
+                   help=f"Largest distance cache, in MB (default: {DEFAULT_MAX_MB})")
+    p.add_argument("--coreset", type=int, default=None,
+                   help=f"Fit k-means on a weighted coreset of this many rows, 0 for the full table (default: {CORESET_ROWS} above {CORESET_MIN_ROWS} blocks)")
+    p.add_argument("--low_alloc", action="store_true",
+                   help="Standardize in place and write with_clusters.csv by row chunks instead of copying the table")
+    p.add_argument("--alloc_report", action="store_true", help="Print the memory allocated by each stage (tracemalloc)")
+    resources.add_arguments(p, jobs=False)
+    args = vars(p.parse_args())
+    resources.configure(jobs=1, threads=args.pop("threads"))
+    return Config(**args)
 
-def load_data(csv_path: Path):
-    # Expect semicolon delimiter based on provided snippet
-    df = pd.read_csv(csv_path, sep=";", dtype=str, keep_default_na=False)
-    # Strip whitespace from column names and values
-    df.columns = [c.strip() for c in df.columns]
-    return df.block, to_numeric(df.drop(columns=["block"]))
+def load_data(csv_path: Path, compact: bool = False):
+    # Single parse with the declared dtypes (float32/int8 in compact mode)
+    df = schema.read_clean(csv_path, encoded=True, compact=compact)
+    return df.block, df.drop(columns=["block"])
 
 def plot_elbow(Xstd: MatrixLike, cfg: Config):
     """
     Plots the elbow method for k-means clustering.
     """
+    import matplotlib.pyplot as plt
+    from sklearn.cluster import KMeans
     wcss = []  # within-cluster sum of squares
     kmin = 2
     kmax = 12
@@ -80,81 +125,149 @@ def plot_elbow(Xstd: MatrixLike, cfg: Config):
     plt.grid(True)
     plt.show()
 
-def create_model(Xstd: MatrixLike, cfg: Config):
+def create_model(Xstd: MatrixLike, cfg: Config, sample_weight: np.ndarray | None = None):
+    from sklearn.cluster import KMeans
     if not PathCsvClean.exists():
         print(f"[ERROR] CSV not found: {PathCsvClean}", file=sys.stderr)
         sys.exit(2)
 
     # Fit final model
-    model = KMeans(n_clusters=cfg.k, n_init=10, random_state=cfg.random_state)
-    model.fit(Xstd)
+    model = KMeans(n_clusters=cfg.k, n_init=cfg.n_init, init=cfg.init, algorithm=cfg.algorithm,
+                   random_state=cfg.random_state)
+    model.fit(Xstd, sample_weight=sample_weight)
     return model
-    
-def gen_csv_with_cluster_profiles(X: pd.DataFrame, model: KMeans, labels, scaler: StandardScaler):
-    # Profiles per cluster (means in original scale)
-    centers_scaled = model.cluster_centers_
-    centers = scaler.inverse_transform(centers_scaled)
-    centers_df = pd.DataFrame()
-    centers_df.insert(0, "cluster", range(len(centers)))
 
-    # Aggregate means from numeric matrix X (already float)
-    Xdf = X.copy()
-    Xdf["cluster"] = labels
-    agg = Xdf.groupby("cluster")[X.columns].mean().reset_index()
+def coreset_rows(cfg: Config, n: int) -> int:
+    """Rows of the coreset k-means is fitted on, 0 to fit on the full table."""
+    if cfg.coreset is None:
+        return CORESET_ROWS if n > CORESET_MIN_ROWS else 0
+    return cfg.coreset if 0 < cfg.coreset < n else 0
+    
+def save_model(path: Path, features: list[str], scaler: StandardScaler, model: KMeans):
+    """Fitted scaler and centroids, enough to assign new blocks without refitting."""
+    import numpy as np
+    np.savez(path, features=np.array(features), mean=scaler.mean_, scale=scaler.scale_,
+             centers=model.cluster_centers_)
 
-    profiles = centers_df.merge(agg, on="cluster", suffixes=("_center", "_mean"))
+def standardize(X: pd.DataFrame, compact: bool = False, stats: TableStats | None = None,
+                chunksize: int = 65536, low_alloc: bool = False) -> tuple[StandardScaler, np.ndarray]:
+    import numpy as np
+    from sklearn.preprocessing import StandardScaler
+    features = list(X.columns)
+    scaler = StandardScaler()
+    if stats is None or not stats.has(features):
+        # StandardScaler keeps float32 input in float32; int8 codes are promoted to the features' dtype
+        values = X.to_numpy(dtype="float32" if compact else None, copy=low_alloc)
+        if low_alloc:
+            # the matrix is our own copy: scale it where it is rather than into a second one
+            return scaler, scaler.fit(values).transform(values, copy=False)
+        return scaler, scaler.fit_transform(values)
+    # scaler read from the statistics written with the table, applied one chunk of rows at a time
+    dtype = np.float32 if compact else np.float64
+    scaler.mean_ = stats.mean(features)
+    scaler.var_ = stats.std(features, ddof=0) ** 2
+    scaler.scale_ = np.sqrt(scaler.var_)
+    scaler.scale_[scaler.scale_ < 10 * np.finfo(float).eps] = 1.0
+    scaler.n_features_in_, scaler.n_samples_seen_ = len(features), stats.rows
+    mean, scale = scaler.mean_.astype(dtype), scaler.scale_.astype(dtype)
+    Xstd = np.empty(X.shape, dtype=dtype)
+    for start in range(0, len(X), chunksize):
+        chunk = X.iloc[start:start + chunksize].to_numpy(dtype=dtype)
+        np.divide(chunk - mean, scale, out=Xstd[start:start + chunksize])
+    return scaler, Xstd
 
-    return profiles
+def write_with_clusters(path: Path, X: pd.DataFrame, labels: np.ndarray, blocks_names: pd.Series,
+                        chunksize: int | None = None):
+    """X with its cluster and block columns; by chunks of rows (no copy of X) when chunksize is given."""
+    if chunksize is None:
+        XwithCluters = X.copy()
+        XwithCluters['cluster'] = labels
+        XwithCluters['block'] = blocks_names
+        XwithCluters.to_csv(path, index=False, sep=";")
+        return
+    for start in range(0, max(len(X), 1), chunksize):
+        stop = start + chunksize
+        chunk = X.iloc[start:stop].assign(cluster=labels[start:stop], block=blocks_names.iloc[start:stop])
+        chunk.to_csv(path, index=False, sep=";", mode="w" if start == 0 else "a", header=start == 0)
 
 def kmeans(cfg: Config):
     print('Executing kmeans...')
+    tracker = AllocTracker(enabled=cfg.alloc_report, label="low-alloc" if cfg.low_alloc else "default",
+                           preload=("pandas", "sklearn.cluster", "sklearn.preprocessing", "scipy.cluster.hierarchy",
+                                    "matplotlib.pyplot"))
     if not PathCsvClean.exists():
-        importdata.importdata()
-    blocks_names, X = load_data(PathCsvClean)
+        importdata.importdata(low_alloc=cfg.low_alloc)
+    with tracker.stage("load"):
+        blocks_names, X = load_data(PathCsvClean, cfg.compact)
+    print(f"[INFO] Feature matrix: {X.memory_usage(index=False).sum()} bytes")
 
-    scaler = StandardScaler()
-    Xstd = scaler.fit_transform(X.values)
-
-    model = create_model(Xstd, cfg)
+    with tracker.stage("standardize"):
+        scaler, Xstd = standardize(X, cfg.compact, column_stats.load(PathCsvClean), low_alloc=cfg.low_alloc)
 
-    labels = model.predict(Xstd)
+    with tracker.stage("fit"):
+        m = coreset_rows(cfg, len(Xstd))
+        if m:
+            import coreset
+            # fit on the weighted summary, then label every block batch by batch
+            model, labels, report = coreset.fit(Xstd, cfg, m)
+            coreset.write_report(PathCsvCoresetReport, report)
+        else:
+            model = create_model(Xstd, cfg)
+            labels = model.predict(Xstd)
 
-    XwithCluters = X.copy()
-    XwithCluters['cluster'] = labels
-    XwithCluters['block'] = blocks_names
-    XwithCluters.to_csv(PathCsvWithClusters, index=False, sep=";")
+    with tracker.stage("with_clusters"):
+        write_with_clusters(PathCsvWithClusters, X, labels, blocks_names, 65536 if cfg.low_alloc else None)
     print(f"[INFO] Wrote {PathCsvWithClusters}")
 
-    profiles = gen_csv_with_cluster_profiles(X, model, labels, scaler)
-    profiles.to_csv(PathCsvClusterProfiles, index=False, sep=";")
+    with tracker.stage("profiles"):
+        # one pass over row chunks instead of a copy of X and a groupby
+        profiles = cluster_profiles(X, labels)
+        profiles.to_csv(PathCsvClusterProfiles, index=False, sep=";")
     print(f"[INFO] Wrote {PathCsvClusterProfiles}")
 
-    hierarchical_clustering(Xstd, cfg)
+    save_model(PathKmeansModel, list(X.columns), scaler, model)
+    print(f"[INFO] Wrote {PathKmeansModel}")
+
+    with tracker.stage("hierarchy"):
+        hierarchical_clustering(Xstd, blocks_names, cfg)
+    tracker.report()
 
 
-def hierarchical_clustering(X: MatrixLike, cfg: Config):
-    model = AgglomerativeClustering(distance_threshold=0, n_clusters=None)
-    model.fit(X)
-    plot_dendrogram(model, truncate_mode="level", p=4)
+def hierarchical_clustering(X: np.ndarray, blocks_names: pd.Series, cfg: Config):
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    from scipy.cluster.hierarchy import dendrogram
+    import hybrid
+    mode = cfg.hierarchy
+    if mode == "auto":
+        mode = "hybrid" if len(X) > HYBRID_MIN_ROWS else "exact"
+    result = pd.DataFrame({"block": blocks_names})
+    if mode == "hybrid":
+        # Ward on weighted k-means centroids instead of on every block
+        centers, weights, micro = hybrid.micro_clusters(X, cfg.micro_clusters, cfg.random_state)
+        print(f"[INFO] Hybrid hierarchy: {len(X)} blocks summarized by {len(centers)} micro-clusters")
+        linkage_matrix = hybrid.weighted_ward(centers, weights)
+        result["micro_cluster"] = micro
+        result["cluster"] = hybrid.cut(linkage_matrix, cfg.k)[micro]
+        # the tree's leaves are micro-clusters: label nodes with their number of blocks
+        sizes = hybrid.node_sizes(linkage_matrix, weights)
+        dendrogram_args = {"leaf_label_func": lambda node: f"({int(sizes[node])})"}
+    else:
+        from scipy.cluster.hierarchy import linkage
+        from distance_cache import DistanceCache
+        # Ward from the cached distances (shared with quality.py); without a cache scipy computes them from X.
+        # Either way linkage holds a float64 condensed matrix: it copies the float32 cache
+        cache = DistanceCache.open(X, PathDistanceCache, cfg.distance_cache_mb) if cfg.distance_cache else None
+        linkage_matrix = linkage(cache.condensed if cache is not None else X, method="ward")
+        result["cluster"] = hybrid.cut(linkage_matrix, cfg.k)
+        dendrogram_args = {}
+    result.to_csv(PathCsvHierarchicalClusters, index=False, sep=";")
+    print(f"[INFO] Wrote {PathCsvHierarchicalClusters}")
+
+    dendrogram(linkage_matrix, truncate_mode="level", p=4, **dendrogram_args)
     plt.xlabel("Nombre de points dans la classe (ou index sans parenthèses).")
     plt.savefig(PathPlotDendogram)
     print(f"[INFO] Wrote {PathPlotDendogram}")
-    
-def plot_dendrogram(model, **kwargs):
-    counts = np.zeros(model. children_ .shape[0])
-    n_samples = len(model. labels_)
-    for i, merge in enumerate(model. children_):
-        current_count = 0
-        for child_idx in merge:
-            if child_idx < n_samples:
-                current_count += 1
-            else:
-                current_count += counts[child_idx-n_samples]
-        counts[i] = current_count
-    linkage_matrix = np.column_stack(
-        [model.children_, model.distances_, counts]
-    ).astype(float)
-    dendrogram(linkage_matrix, **kwargs)
 
 if __name__=='__main__':
     kmeans(parse_args())
@@ -0,0 +1,167 @@
+"""
+Block-name index
+----------------
+
+Finds blocks by name without scanning the table:
+
+- exact: normalized name (case, spacing and punctuation folded) -> rows;
+- prefix: binary search in the sorted normalized names;
+- words: names containing every word of the query;
+- pattern: `*Copper*`, `Oak *`, candidates narrowed with the trigram
+  postings, then checked;
+- fuzzy: names sharing the most trigrams with the query, ranked by similarity
+  (typos, missing words: "oak stair" -> Oak Stairs).
+
+Built from any table with a `block` column (and `cluster` when present, to
+answer membership queries), saved next to it as `<table>.names.json` and
+rebuilt only when the table changes. Only the standard library is used.
+
+    index = NameIndex.open(PathCsvWithClusters)
+    for row in index.find("*Copper*"):
+        print(index.names[row], index.clusters[row])
+"""
+
+from __future__ import annotations
+
+import bisect
+import csv
+import fnmatch
+import json
+import re
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from pathlib import Path
+
+INDEX_VERSION = 1
+WORD = re.compile(r"[0-9a-z]+")
+
+
+def normalize(name: str) -> str:
+    return " ".join(WORD.findall(name.casefold()))
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def index_path(table: Path) -> Path:
+    return table.with_name(table.name + ".names.json")
+
+
+class NameIndex:
+    def __init__(self, names: list[str], clusters: list[int | None], postings: dict | None = None):
+        self.names = names
+        self.clusters = clusters
+        self.normalized = [normalize(n) for n in names]
+        if postings is None:
+            postings = {"exact": defaultdict(list), "words": defaultdict(list), "grams": defaultdict(list)}
+            for row, key in enumerate(self.normalized):
+                postings["exact"][key].append(row)
+                for word in set(key.split()):
+                    postings["words"][word].append(row)
+                for gram in trigrams(key):
+                    postings["grams"][gram].append(row)
+        self.exact: dict[str, list[int]] = postings["exact"]
+        self.words: dict[str, list[int]] = postings["words"]
+        self.grams: dict[str, list[int]] = postings["grams"]
+        self.sorted_keys = sorted(self.exact)
+
+    # ---- building and persistence ----
+
+    @classmethod
+    def build(cls, table: Path) -> NameIndex:
+        names, clusters = [], []
+        with open(table, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f, delimiter=";"):
+                names.append(row["block"])
+                clusters.append(int(row["cluster"]) if row.get("cluster") not in (None, "") else None)
+        return cls(names, clusters)
+
+    def save(self, path: Path, source: Path):
+        st = source.stat()
+        data = {"version": INDEX_VERSION, "source": [st.st_mtime_ns, st.st_size],
+                "names": self.names, "clusters": self.clusters,
+                "postings": {"exact": self.exact, "words": self.words, "grams": self.grams}}
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path, source: Path) -> NameIndex | None:
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text(encoding="utf-8"))
+        st = source.stat()
+        if data.get("version") != INDEX_VERSION or data.get("source") != [st.st_mtime_ns, st.st_size]:
+            return None
+        return cls(data["names"], data["clusters"], data["postings"])
+
+    @classmethod
+    def open(cls, table: Path, rebuild: bool = False) -> NameIndex:
+        path = index_path(table)
+        index = None if rebuild else cls.load(path, table)
+        if index is None:
+            index = cls.build(table)
+            index.save(path, table)
+        return index
+
+    # ---- lookups ----
+
+    def lookup(self, name: str) -> list[int]:
+        return list(self.exact.get(normalize(name), []))
+
+    def prefix(self, text: str) -> list[int]:
+        key = normalize(text)
+        start = bisect.bisect_left(self.sorted_keys, key)
+        rows = []
+        for k in self.sorted_keys[start:]:
+            if not k.startswith(key):
+                break
+            rows.extend(self.exact[k])
+        return sorted(rows)
+
+    def words_all(self, text: str) -> list[int]:
+        """Rows whose name contains every word of `text` ("copper stairs" -> Waxed Cut Copper Stairs, ...)."""
+        rows: set[int] | None = None
+        for word in normalize(text).split():
+            found = set(self.words.get(word, ()))
+            rows = found if rows is None else rows & found
+        return sorted(rows or ())
+
+    def pattern(self, pattern: str) -> list[int]:
+        """Rows whose name matches a pattern where `*` stands for any text, case-insensitive."""
+        parts = [normalize(p) for p in pattern.split("*")]
+        target = "*".join(parts)
+        # rows containing every trigram of the literal parts, then the real check
+        candidates: set[int] | None = None
+        for part in parts:
+            for gram in {part[i:i + 3] for i in range(len(part) - 2)}:
+                rows = set(self.grams.get(gram, ()))
+                candidates = rows if candidates is None else candidates & rows
+        rows = range(len(self.names)) if candidates is None else sorted(candidates)
+        return [r for r in rows if fnmatch.fnmatchcase(self.normalized[r], target)]
+
+    def fuzzy(self, text: str, limit: int | None = 10, cutoff: float = 0.6) -> list[tuple[int, float]]:
+        """(row, similarity) of the closest names, best first (all of those above `cutoff` if `limit` is None)."""
+        key = normalize(text)
+        shared = Counter()
+        for gram in trigrams(key):
+            for row in self.grams.get(gram, ()):
+                shared[row] += 1
+        # rank the rows sharing the most trigrams by the similarity of the whole names
+        scored = [(row, SequenceMatcher(None, key, self.normalized[row]).ratio())
+                  for row, _ in shared.most_common(None if limit is None else max(50, 5 * limit))]
+        scored = [(row, score) for row, score in scored if score >= cutoff]
+        scored.sort(key=lambda rs: (-rs[1], self.names[rs[0]]))
+        return scored[:limit]
+
+    def find(self, query: str, limit: int | None = 10) -> list[int]:
+        """Pattern if the query has a `*`, else the first non-empty of: exact name, prefix, all words, fuzzy.
+        A query without any letter or digit ("?", "-") matches nothing."""
+        if "*" in query:
+            return self.pattern(query)
+        if not normalize(query):
+            return []
+        return (self.lookup(query) or self.prefix(query) or self.words_all(query)
+                or [row for row, _ in self.fuzzy(query, limit)])
@@ -7,14 +7,17 @@ Reads the clustered data CSV and plots a 2D scatter of two chosen features,
 colored by cluster.
 """
 
+from __future__ import annotations
+
 import argparse
 import itertools
-import pandas as pd
-import matplotlib.pyplot as plt
-
-import kmeans
+from typing import TYPE_CHECKING
 
 from const import PathCsvWithClusters, PathPngScatter
+import schema
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def parse_args(columns):
@@ -25,6 +28,7 @@ def parse_args(columns):
 
 
 def main(df: pd.DataFrame, feature_x: str, feature_y: str):
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots()
     clusters = df["cluster"].unique()
     for cl in sorted(clusters):
@@ -53,9 +57,11 @@ def generate_all(df: pd.DataFrame):
         main(df, x, y)
 
 if __name__ == "__main__":
+    argparse.ArgumentParser(description="Scatter plots of clustered Minecraft blocks for the usual feature pairs").parse_args()
     if not PathCsvWithClusters.exists():
+        import kmeans
         kmeans.kmeans(kmeans.Config())
-    df = pd.read_csv(PathCsvWithClusters, sep=";")
+    df = schema.read_clean(PathCsvWithClusters, encoded=True, extra_dtypes={"cluster": "int64"})
     generate_all(df)
     #args = parse_args(df.columns)
     #main(df, args.x, args.y)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Cluster profiles
+----------------
+
+Per-cluster feature distributions computed in one pass over row chunks, with
+mergeable summaries (common/streaming_stats.py): the table is never copied as
+a whole, and chunks can be summarized by several worker processes whose
+partial results are merged.
+
+cluster_profiles.csv has one row per cluster: the feature means under the
+feature names (as before), the cluster size, then for every feature
+<feature>_std, _min, _q25, _median, _q75 and _max (quantiles are approximate
+once a cluster holds more than a few hundred blocks).
+
+Usage:
+  python profiles.py                       # from data_with_clusters.csv
+  python profiles.py --chunksize 100000 --jobs 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+
+from const import PathCsvClusterProfiles, PathCsvWithClusters
+import resources
+import schema
+from streaming_stats import GroupedStats
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+QUANTILES = {"q25": 0.25, "median": 0.5, "q75": 0.75}
+
+
+def summarize_chunk(X: np.ndarray, labels: np.ndarray) -> GroupedStats:
+    stats = GroupedStats(X.shape[1])
+    stats.update(X, labels)
+    return stats
+
+
+def aggregate(chunks: Iterable[tuple[np.ndarray, np.ndarray]], n_features: int, jobs: int = 1,
+              threads: int = 1) -> GroupedStats:
+    """Merge the summaries of (features, labels) chunks, summarized in `jobs` processes."""
+    total = GroupedStats(n_features)
+    if jobs <= 1:
+        for X, labels in chunks:
+            total.update(X, labels)
+        return total
+    chunks = iter(chunks)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=resources.worker_init, initargs=(threads,)) as pool:
+        # a bounded number of chunks in flight keeps memory flat
+        running = {pool.submit(summarize_chunk, X, labels) for X, labels in itertools.islice(chunks, 2 * jobs)}
+        while running:
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                total.merge(future.result())
+                if (chunk := next(chunks, None)) is not None:
+                    running.add(pool.submit(summarize_chunk, *chunk))
+    return total
+
+
+def profiles_frame(stats: GroupedStats, features: list[str]) -> pd.DataFrame:
+    import pandas as pd
+    rows = []
+    for label in stats.labels():
+        running, sketches = stats.stats[label], stats.sketches[label]
+        row = {"cluster": label} | dict(zip(features, running.mean))
+        row["count"] = running.count
+        std = running.std()
+        quantiles = [s.quantiles(QUANTILES.values()) for s in sketches]
+        for j, f in enumerate(features):
+            row[f"{f}_std"] = std[j]
+            row[f"{f}_min"] = running.min[j]
+            row |= {f"{f}_{name}": q for name, q in zip(QUANTILES, quantiles[j])}
+            row[f"{f}_max"] = running.max[j]
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def frame_chunks(X: pd.DataFrame, labels: np.ndarray, chunksize: int):
+    # row slices of the feature frame: only one chunk is converted at a time
+    for start in range(0, len(X), chunksize):
+        yield X.iloc[start:start + chunksize].to_numpy(dtype=float), labels[start:start + chunksize]
+
+
+def cluster_profiles(X: pd.DataFrame, labels: np.ndarray, chunksize: int = 65536) -> pd.DataFrame:
+    import numpy as np
+    features = list(X.columns)
+    stats = aggregate(frame_chunks(X, np.asarray(labels), chunksize), len(features))
+    return profiles_frame(stats, features)
+
+
+def csv_chunks(path: Path, features: list[str], chunksize: int):
+    for chunk in schema.read_clean(path, encoded=True, chunksize=chunksize, usecols=features + ["cluster"],
+                                   extra_dtypes={"cluster": "int64"}):
+        yield chunk[features].to_numpy(dtype=float), chunk["cluster"].to_numpy()
+
+
+def main():
+    p = argparse.ArgumentParser(description="Per-cluster feature distributions, in one pass over the clustered table.")
+    p.add_argument("--input", type=Path, default=PathCsvWithClusters, help=f"Encoded table with a cluster column (default: {PathCsvWithClusters})")
+    p.add_argument("--output", type=Path, default=PathCsvClusterProfiles, help=f"Profiles table (default: {PathCsvClusterProfiles})")
+    p.add_argument("--chunksize", type=int, default=65536, help="Rows per chunk (default: 65536)")
+    resources.add_arguments(p, jobs_help="Processes summarizing chunks")
+    args = p.parse_args()
+    alloc = resources.configure(args.jobs, args.threads)
+
+    if not args.input.exists():
+        import kmeans
+        kmeans.kmeans(kmeans.Config())
+    features = [c for c in schema.header(args.input) if c in schema.NUMERIC_COLUMNS + schema.CATEGORICAL_COLUMNS]
+    stats = aggregate(csv_chunks(args.input, features, args.chunksize), len(features), jobs=alloc.jobs,
+                      threads=alloc.threads)
+    profiles_frame(stats, features).to_csv(args.output, index=False, sep=";")
+    print(f"[INFO] Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
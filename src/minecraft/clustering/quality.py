@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Cluster quality
+---------------
+
+Scores the k-means partition written by kmeans.py, on the features
+standardized with the fitted scaler (kmeans_model.npz):
+
+- silhouette of every block, from pairwise distances computed one chunk of
+  rows at a time (memory bounded by --memory, never the n x n matrix), or read
+  from the distance cache written by kmeans.py's exact hierarchy;
+- for very large tables, a stratified sample of blocks per cluster instead,
+  with confidence intervals (each sampled block is still scored against all
+  blocks, so the only error is the sampling one);
+- Davies-Bouldin and Calinski-Harabasz indices.
+
+Outputs (next to cluster_profiles.csv):
+- block_silhouette.csv (block, cluster, silhouette; header only in sampled mode)
+- cluster_quality.csv (per cluster and overall: silhouette mean, CI, share of negative silhouettes)
+- cluster_quality_summary.csv (metric;value)
+
+Usage:
+  python quality.py
+  python quality.py --sample 5000 --confidence 0.99
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import math
+from pathlib import Path
+from statistics import NormalDist
+from typing import TYPE_CHECKING
+
+from const import (PathCsvBlockSilhouette, PathCsvClusterQuality, PathCsvQualitySummary, PathCsvWithClusters,
+                   PathDistanceCache,
+                   PathKmeansModel)
+from distance_cache import DEFAULT_MAX_MB
+import resources
+import schema
+
+if TYPE_CHECKING:
+    import numpy as np
+    from distance_cache import DistanceCache
+
+# above this many blocks, the silhouette is estimated on a sample unless --exact
+MAX_EXACT = 50_000
+
+
+def load_standardized(path: Path, model_path: Path) -> tuple[list[str], list[str], np.ndarray, np.ndarray]:
+    """Block names, feature names, standardized features and cluster labels of a table with a cluster column."""
+    import numpy as np
+    df = schema.read_clean(path, encoded=True, extra_dtypes={"cluster": "int64"})
+    dtype = np.float64
+    if model_path.exists():
+        with np.load(model_path) as f:
+            features, mean, scale = [str(x) for x in f["features"]], f["mean"], f["scale"]
+            # standardized in the dtype of the fit (float32 with --compact), as kmeans.standardize did:
+            # same values, so the distance cache built by kmeans is reused
+            dtype = f["centers"].dtype
+    else:
+        features = [c for c in df.columns if c not in ("block", "cluster")]
+        X = df[features].to_numpy(dtype=float)
+        mean, scale = X.mean(axis=0), X.std(axis=0)
+        scale[scale == 0] = 1.0
+    Xstd = (df[features].to_numpy(dtype=dtype) - mean.astype(dtype)) / scale.astype(dtype)
+    return df.block.tolist(), features, Xstd, df.cluster.to_numpy()
+
+
+def silhouette_rows(X: np.ndarray, labels: np.ndarray, rows: np.ndarray, memory_mb: float = 256,
+                    cache: DistanceCache | None = None) -> np.ndarray:
+    """
+    Silhouette of X[rows] against all of X. Distances are computed (or read from
+    `cache`) for chunks of rows sized so that the chunk x n distance block fits
+    in `memory_mb`.
+    """
+    import numpy as np
+    n = len(X)
+    clusters, codes = np.unique(labels, return_inverse=True)
+    sizes = np.bincount(codes, minlength=len(clusters)).astype(float)
+    onehot = np.zeros((n, len(clusters)))
+    onehot[np.arange(n), codes] = 1.0
+    sq = np.einsum("ij,ij->i", X, X)
+    chunk = max(1, int(memory_mb * 2**20 / (8 * max(n, 1) * 3)))
+
+    out = np.empty(len(rows))
+    for start in range(0, len(rows), chunk):
+        idx = rows[start:start + chunk]
+        if cache is not None:
+            dist = cache.rows(idx)
+        else:
+            d2 = sq[idx, None] + sq[None, :] - 2.0 * (X[idx] @ X.T)
+            dist = np.sqrt(np.maximum(d2, 0.0, out=d2), out=d2)
+        sums = dist @ onehot                                    # distance sums to every cluster
+        own = codes[idx]
+        own_size = sizes[own] - 1
+        a = np.divide(sums[np.arange(len(idx)), own], own_size, out=np.zeros(len(idx)), where=own_size > 0)
+        mean_other = sums / sizes
+        mean_other[np.arange(len(idx)), own] = np.inf
+        b = mean_other.min(axis=1)
+        s = np.divide(b - a, np.maximum(a, b), out=np.zeros(len(idx)), where=np.maximum(a, b) > 0)
+        # a block alone in its cluster has a silhouette of 0, as in sklearn
+        s[own_size == 0] = 0.0
+        out[start:start + len(idx)] = s
+    return out
+
+
+def stratified_sample(labels: np.ndarray, size: int, seed: int, min_per_cluster: int = 30) -> np.ndarray:
+    """Row indices, allocated to clusters in proportion to their size (at least `min_per_cluster`)."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    n = len(labels)
+    picked = []
+    for c in np.unique(labels):
+        members = np.flatnonzero(labels == c)
+        m = min(len(members), max(min_per_cluster, round(size * len(members) / n)))
+        picked.append(rng.choice(members, size=m, replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def mean_ci(values: np.ndarray, population: int, z: float) -> tuple[float, float, float]:
+    """Mean and normal-approximation CI of a sample without replacement (finite population correction)."""
+    m = len(values)
+    mean = float(values.mean())
+    if m == population or m < 2:
+        return mean, mean, mean
+    half = z * float(values.std(ddof=1)) / math.sqrt(m) * math.sqrt(1 - m / population)
+    return mean, mean - half, mean + half
+
+
+def quality_table(scores: np.ndarray, labels: np.ndarray, sample_labels: np.ndarray, confidence: float) -> list[dict]:
+    import numpy as np
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    rows = []
+    overall_mean, overall_var, n = 0.0, 0.0, len(labels)
+    for c in np.unique(labels):
+        population = int(np.sum(labels == c))
+        s = scores[sample_labels == c]
+        mean, low, high = mean_ci(s, population, z)
+        rows.append({"cluster": int(c), "size": population, "scored": len(s), "silhouette": mean,
+                     "ci_low": low, "ci_high": high, "negative_share": float(np.mean(s < 0))})
+        # stratified estimator: clusters weighted by their share of the blocks
+        w = population / n
+        overall_mean += w * mean
+        if 1 < len(s) < population:
+            overall_var += w ** 2 * float(s.var(ddof=1)) / len(s) * (1 - len(s) / population)
+    half = z * math.sqrt(overall_var)
+    negative = sum(r["size"] * r["negative_share"] for r in rows) / n
+    rows.append({"cluster": "all", "size": n, "scored": len(scores), "silhouette": overall_mean,
+                 "ci_low": overall_mean - half, "ci_high": overall_mean + half, "negative_share": negative})
+    return rows
+
+
+def write_csv(path: Path, rows: list[dict], fieldnames: list[str] | None = None):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames or list(rows[0]), delimiter=";")
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"[INFO] Wrote {path}")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Silhouette, Davies-Bouldin and Calinski-Harabasz scores of the k-means clusters.")
+    p.add_argument("--input", type=Path, default=PathCsvWithClusters, help="Encoded table with a cluster column")
+    p.add_argument("--model", type=Path, default=PathKmeansModel, help="Scaler of the fit (default: kmeans_model.npz)")
+    p.add_argument("--sample", type=int, default=None, help=f"Estimate the silhouette on a stratified sample of this many blocks (default: only above {MAX_EXACT} blocks)")
+    p.add_argument("--exact", action="store_true", help="Score every block whatever the table size")
+    p.add_argument("--confidence", type=float, default=0.95, help="Confidence level of the sampled intervals (default: 0.95)")
+    p.add_argument("--memory", type=float, default=256, help="MB allowed for a chunk of pairwise distances (default: 256)")
+    p.add_argument("--seed", type=int, default=42, help="Sampling seed (default: 42)")
+    p.add_argument("--no_distance_cache", dest="distance_cache", action="store_false",
+                   help="Compute the distances instead of reading or writing the distance cache")
+    p.add_argument("--distance_cache_mb", type=float, default=DEFAULT_MAX_MB,
+                   help=f"Largest distance cache, in MB (default: {DEFAULT_MAX_MB})")
+    resources.add_arguments(p, jobs=False)
+    return p.parse_args()
+
+
+def main():
+    args = parse_args()
+    resources.configure(jobs=1, threads=args.threads)
+    import numpy as np
+    from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score
+    if not args.input.exists():
+        import kmeans
+        kmeans.kmeans(kmeans.Config())
+
+    blocks, _, Xstd, labels = load_standardized(args.input, args.model)
+    n = len(labels)
+    sample = args.sample
+    if sample is None and n > MAX_EXACT and not args.exact:
+        sample = MAX_EXACT // 5
+    sampled = sample is not None and sample < n and not args.exact
+    rows = stratified_sample(labels, sample, args.seed) if sampled else np.arange(n)
+    print(f"[INFO] Silhouette of {len(rows)} of {n} blocks" + (" (stratified sample)" if sampled else ""))
+    cache = None
+    if args.distance_cache:
+        from distance_cache import DistanceCache
+        cache = DistanceCache.open(Xstd, PathDistanceCache, args.distance_cache_mb)
+    scores = silhouette_rows(Xstd, labels, rows, args.memory, cache)
+
+    # sampled: header only, since the scores of a previous exact run would no longer match the clusters
+    # (the file stays, so the pipeline does not take the stage for stale)
+    block_scores = [] if sampled else [{"block": b, "cluster": int(c), "silhouette": float(s)}
+                                       for b, c, s in zip(blocks, labels, scores)]
+    write_csv(PathCsvBlockSilhouette, block_scores, ["block", "cluster", "silhouette"])
+    table = quality_table(scores, labels, labels[rows], args.confidence)
+    write_csv(PathCsvClusterQuality, table)
+
+    overall = table[-1]
+    summary = [
+        {"metric": "silhouette", "value": overall["silhouette"]},
+        {"metric": "silhouette_ci_low", "value": overall["ci_low"]},
+        {"metric": "silhouette_ci_high", "value": overall["ci_high"]},
+        {"metric": "silhouette_scored_blocks", "value": len(rows)},
+        {"metric": "davies_bouldin", "value": davies_bouldin_score(Xstd, labels)},
+        {"metric": "calinski_harabasz", "value": calinski_harabasz_score(Xstd, labels)},
+    ]
+    write_csv(PathCsvQualitySummary, summary)
+    for row in summary:
+        print(f"  {row['metric']:<26} {row['value']:.6g}")
+
+
+if __name__ == "__main__":
+    main()
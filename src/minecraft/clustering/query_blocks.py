@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Query the block table through its bitmap index (bitmap_index.py).
+
+Terms are `column op value` joined by `and`; op is ==, !=, <, <=, >, >= or
+`in` (qualitative columns: `spawnable in (Yes, Maybe)`). Qualitative levels are
+ordered, so `movable >= Maybe` works too.
+
+Usage:
+  python query_blocks.py "conductive == Yes and movable != No and blast_resistance > 6 and luminance > 0"
+  python query_blocks.py "full_cube == Yes" --group-by cluster
+  python query_blocks.py "luminance >= 15" --count
+  python query_blocks.py "movable == Yes" --name "*copper*"
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from const import PathCsvClean, PathCsvWithClusters
+from bitmap_index import BlockIndex, QueryError
+from name_index import NameIndex
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Filter and count blocks by property, using a bitmap index.")
+    p.add_argument("query", nargs="?", default="", help="Filter, e.g. \"conductive == Yes and luminance > 0\" (default: all blocks)")
+    p.add_argument("--name", default=None, help="Only blocks whose name matches: exact, prefix, words, *pattern* or fuzzy")
+    p.add_argument("--group-by", action="append", default=[], help="Count the matches per level of a qualitative column (repeatable)")
+    p.add_argument("--count", action="store_true", help="Only print the number of matching blocks")
+    p.add_argument("--limit", type=int, default=50, help="Blocks listed at most (default: 50, 0 for all)")
+    p.add_argument("--table", type=Path, default=None, help="Encoded table (default: data_with_clusters.csv, else clean.csv)")
+    p.add_argument("--rebuild", action="store_true", help="Rebuild the index even if it is up to date")
+    args = p.parse_args()
+
+    table = args.table or (PathCsvWithClusters if PathCsvWithClusters.exists() else PathCsvClean)
+    if not table.exists():
+        print(f"[ERROR] {table} not found, run importdata.py or kmeans.py first", file=sys.stderr)
+        return 2
+    start = time.perf_counter()
+    index = BlockIndex.open(table, rebuild=args.rebuild)
+    opened = time.perf_counter()
+    try:
+        selected = index.filter(args.query)
+        if args.name:
+            # both indexes number the rows of the same table
+            selected &= index.rows_bitmap(NameIndex.open(table, rebuild=args.rebuild).find(args.name))
+        groups = {column: index.group_counts(column, selected) for column in args.group_by}
+    except QueryError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 2
+    done = time.perf_counter()
+
+    count = index.count(selected)
+    print(f"{count} / {index.n} blocks")
+    for column, counts in groups.items():
+        print(f"\nBy {column}:")
+        for label, n in counts.items():
+            if n:
+                print(f"  {label:<28} {n}")
+    if not args.count and not args.group_by:
+        names = index.names(selected)
+        shown = names if args.limit == 0 else names[:args.limit]
+        print("\n".join(f"- {name}" for name in shown))
+        if len(shown) < len(names):
+            print(f"... {len(names) - len(shown)} more (--limit 0 to list all)")
+    print(f"[INFO] index opened in {(opened - start) * 1000:.1f} ms, query answered in {(done - opened) * 1000:.2f} ms",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
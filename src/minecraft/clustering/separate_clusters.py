@@ -2,20 +2,51 @@
 Read data with clusters and print blocks in separate lists per cluster
 """
 
-import pandas as pd
+import argparse
+import csv
+from collections import defaultdict
+from pathlib import Path
 
-import kmeans
 from const import PathCsvWithClusters
+from name_index import NameIndex
 
-def main(df: pd.DataFrame):
-    for cl in sorted(df["cluster"].unique()):
-        sub = df[df["cluster"] == cl].block
-        print('Cluster', cl + 1, f'({len(sub)} items, {len(sub)/len(df):.2%})')
+def read_clusters(path: Path) -> dict[int, list[str]]:
+    # Only two columns are needed, so the csv module is enough and avoids importing pandas
+    clusters: dict[int, list[str]] = defaultdict(list)
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f, delimiter=";"):
+            clusters[int(row["cluster"])].append(row["block"])
+    return clusters
+
+def main(clusters: dict[int, list[str]]):
+    total = sum(len(blocks) for blocks in clusters.values())
+    for cl in sorted(clusters):
+        sub = clusters[cl]
+        print('Cluster', cl + 1, f'({len(sub)} items, {len(sub)/total:.2%})')
         sep = '\n- '
         print(sep + sep.join(sorted(sub)) + '\n')
 
+def find(queries: list[str], limit: int):
+    # answered from the name index instead of reading the whole table
+    index = NameIndex.open(PathCsvWithClusters)
+    for query in queries:
+        rows = index.find(query, limit or None)
+        print(f'{query!r}: {len(rows)} match(es)')
+        for row in rows[:limit] if limit else rows:
+            print(f'- {index.names[row]} -> Cluster {index.clusters[row] + 1}')
+        if limit and len(rows) > limit:
+            print(f'... {len(rows) - limit} more')
+
 if __name__ == '__main__':
+    p = argparse.ArgumentParser(description="Print the blocks of each cluster.")
+    p.add_argument("--find", action="append", default=[], metavar="NAME",
+                   help="Only print the cluster of the blocks matching NAME: exact, prefix, words, *pattern* or fuzzy (repeatable)")
+    p.add_argument("--limit", type=int, default=20, help="Matches printed per --find (default: 20, 0 for all)")
+    args = p.parse_args()
     if not PathCsvWithClusters.exists():
+        import kmeans
         kmeans.kmeans(kmeans.Config())
-    df = pd.read_csv(PathCsvWithClusters, sep=";")
-    main(df)
\ No newline at end of file
+    if args.find:
+        find(args.find, args.limit)
+    else:
+        main(read_clusters(PathCsvWithClusters))
@@ -0,0 +1,228 @@
+"""
+Column statistics sidecar
+-------------------------
+
+The writers of the clean tables (blocks/export_clean.py, clustering/importdata.py)
+summarize every column while they write it, and save the summary next to the
+table as `<table>.stats.json`:
+
+- numeric columns: count, missing, mean, variance, std (ddof=1), min, max and
+  quantiles (from a `QuantileSketch`, exact up to about 1/k of the rank); the
+  median too, unless the writer asked for `exact_median`: it then keeps the
+  column's values and stores the median pandas would compute (the midpoint of
+  the two middle values for an even count), so that imputing from the sidecar
+  gives the same table as imputing from the data;
+- qualitative columns: level frequencies, plus the numeric summary of their
+  ordinal codes in an encoded table.
+
+Readers standardize and impute from these numbers instead of making their own
+pass over the data. A sidecar is tied to its table by the table's mtime and
+size, so `load` returns None for a stale or missing sidecar and the reader
+falls back to computing the statistics itself.
+
+    stats = ColumnStats(schema.NUMERIC_COLUMNS, schema.CATEGORICAL_COLUMNS)
+    for chunk in chunks:
+        stats.update(chunk)
+    stats.save(PathCsvClean, encoded=True)
+
+    table = load(PathCsvClean)
+    if table is not None:
+        mean, std = table.mean(features), table.std(features, ddof=0)
+"""
+
+from __future__ import annotations
+
+import json
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+
+import schema
+from streaming_stats import QuantileSketch, RunningStats
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+STATS_VERSION = 1
+QUANTILES = (0.0, 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99, 1.0)
+SKETCH_K = 1024
+# rows buffered by `update_row` before they are summarized together
+ROW_BUFFER = 65_536
+
+
+def sidecar_path(table: Path) -> Path:
+    return table.with_name(table.name + ".stats.json")
+
+
+def numeric_summary(stats: RunningStats, sketch: QuantileSketch, missing: int) -> dict:
+    count = stats.count
+    summary = {"count": count, "missing": missing}
+    if count == 0:
+        return summary
+    variance = float(stats.variance(ddof=1)[0]) if count > 1 else 0.0
+    summary |= {"mean": float(stats.mean[0]), "m2": float(stats.m2[0]), "variance": variance,
+                "std": variance ** 0.5, "min": float(stats.min[0]), "max": float(stats.max[0])}
+    quantiles = sketch.quantiles(QUANTILES)
+    summary["quantiles"] = {f"{q:g}": float(v) for q, v in zip(QUANTILES, quantiles)}
+    summary["median"] = summary["quantiles"]["0.5"]
+    return summary
+
+
+class ColumnStats:
+    """One-pass summary of the numeric and qualitative columns of a table, built chunk by chunk."""
+
+    def __init__(self, numeric: list[str], categorical: list[str], seed: int = 0, exact_median: bool = False):
+        self.numeric = list(numeric)
+        self.categorical = list(categorical)
+        self.rows = 0
+        self.stats = {c: RunningStats(1) for c in self.numeric}
+        self.sketches = {c: QuantileSketch(SKETCH_K, seed + j) for j, c in enumerate(self.numeric)}
+        # present values of every numeric column, for writers that hold the whole table anyway
+        self.values: dict[str, list[np.ndarray]] | None = {c: [] for c in self.numeric} if exact_median else None
+        self.missing = Counter()
+        self.frequencies = {c: Counter() for c in self.categorical}
+        self._buffer: list[dict] = []
+
+    def update(self, frame: pd.DataFrame):
+        """Add a chunk of rows with label (not encoded) qualitative columns."""
+        import numpy as np
+        self.rows += len(frame)
+        for c in self.numeric:
+            values = frame[c].to_numpy(dtype=float) if c in frame.columns else np.full(len(frame), np.nan)
+            present = values[~np.isnan(values)]
+            self.missing[c] += len(values) - len(present)
+            self.stats[c].update(present[:, None])
+            self.sketches[c].update(present)
+            if self.values is not None:
+                self.values[c].append(present)
+        for c in self.categorical:
+            if c in frame.columns:
+                self.frequencies[c].update(frame[c].dropna().astype(str))
+                self.missing[c] += int(frame[c].isna().sum())
+            else:
+                self.missing[c] += len(frame)
+
+    def update_row(self, row: dict):
+        """Add one row (dict of values); rows are summarized ROW_BUFFER at a time."""
+        self._buffer.append(row)
+        if len(self._buffer) >= ROW_BUFFER:
+            self.flush()
+
+    def flush(self):
+        import pandas as pd
+        if self._buffer:
+            rows, self._buffer = self._buffer, []
+            self.update(pd.DataFrame.from_records(rows, columns=self.numeric + self.categorical))
+
+    def summary(self, encoded: bool = False) -> dict:
+        import numpy as np
+        self.flush()
+        columns = {c: numeric_summary(self.stats[c], self.sketches[c], self.missing[c]) for c in self.numeric}
+        if self.values is not None:
+            for c in self.numeric:
+                if columns[c]["count"]:
+                    columns[c]["median"] = float(np.median(np.concatenate(self.values[c])))
+        for c in self.categorical:
+            entry = {"count": sum(self.frequencies[c].values()), "missing": self.missing[c],
+                     "frequencies": dict(self.frequencies[c].most_common())}
+            if encoded and c in schema.LEVELS:
+                # an encoded table holds ordinal codes: summarize them as numbers, exactly, from the frequencies
+                entry |= code_summary(c, self.frequencies[c], self.missing[c])
+            columns[c] = entry
+        return {"rows": self.rows, "encoded": encoded, "columns": columns}
+
+    def save(self, table: Path, encoded: bool = False) -> Path:
+        """Write the sidecar of `table`, which must be complete (its mtime and size are recorded)."""
+        path = sidecar_path(table)
+        st = table.stat()
+        data = {"version": STATS_VERSION, "source": [st.st_mtime_ns, st.st_size]} | self.summary(encoded)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+        tmp.replace(path)
+        return path
+
+
+def code_summary(column: str, frequencies: Counter, missing: int) -> dict:
+    import numpy as np
+    codes = schema.codes(column)
+    values = np.array([codes[label] for label in frequencies if label in codes], dtype=float)
+    weights = np.array([n for label, n in frequencies.items() if label in codes], dtype=float)
+    count = int(weights.sum())
+    # labels outside the schema are written as empty cells in the encoded table
+    summary = {"count": count, "missing": missing + sum(frequencies.values()) - count}
+    if count == 0:
+        return summary
+    order = np.argsort(values)
+    values, weights = values[order], weights[order]
+    mean = float(np.average(values, weights=weights))
+    m2 = float(np.sum(weights * (values - mean) ** 2))
+    variance = m2 / (count - 1) if count > 1 else 0.0
+    cumulative = np.cumsum(weights)
+    ranks = np.searchsorted(cumulative, np.asarray(QUANTILES) * count, side="left")
+    quantiles = {f"{q:g}": float(values[min(r, len(values) - 1)]) for q, r in zip(QUANTILES, ranks)}
+    return summary | {"mean": mean, "m2": m2, "variance": variance, "std": variance ** 0.5,
+                      "min": float(values[0]), "max": float(values[-1]),
+                      "quantiles": quantiles, "median": quantiles["0.5"]}
+
+
+class TableStats:
+    """Statistics read back from a sidecar."""
+
+    def __init__(self, data: dict):
+        self.rows: int = data["rows"]
+        self.encoded: bool = data["encoded"]
+        self.columns: dict[str, dict] = data["columns"]
+
+    def has(self, columns: Iterable[str]) -> bool:
+        return all("mean" in self.columns.get(c, {}) for c in columns)
+
+    def _values(self, key: str, columns: Iterable[str]) -> np.ndarray:
+        import numpy as np
+        return np.array([self.columns[c][key] for c in columns], dtype=float)
+
+    def mean(self, columns: Iterable[str]) -> np.ndarray:
+        return self._values("mean", columns)
+
+    def std(self, columns: Iterable[str], ddof: int = 1) -> np.ndarray:
+        import numpy as np
+        m2, count = self._values("m2", columns), self._values("count", columns)
+        return np.sqrt(m2 / np.maximum(count - ddof, 1))
+
+    def median(self, columns: Iterable[str]) -> np.ndarray:
+        return self._values("median", columns)
+
+    def frequencies(self, column: str) -> dict[str, int]:
+        return dict(self.columns[column].get("frequencies", {}))
+
+    def filled(self, column: str, rows: int, value: float) -> RunningStats | None:
+        """
+        Moments of `column` once its missing values among `rows` rows are replaced by `value`
+        (e.g. the median), or None if the sidecar does not describe those rows.
+        """
+        entry = self.columns[column]
+        filled = rows - entry["count"]
+        if "mean" not in entry or filled < 0:
+            return None
+        stats = RunningStats(1)
+        stats.count, stats.mean[0], stats.m2[0] = entry["count"], entry["mean"], entry["m2"]
+        stats.min[0], stats.max[0] = entry["min"], entry["max"]
+        if filled:
+            imputed = RunningStats(1)
+            imputed.count, imputed.mean[0], imputed.m2[0] = filled, value, 0.0
+            imputed.min[0] = imputed.max[0] = value
+            stats.merge(imputed)
+        return stats
+
+
+def load(table: Path) -> TableStats | None:
+    """Statistics of `table`, or None when its sidecar is missing or older than the table."""
+    path = sidecar_path(table)
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        st = table.stat()
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if data.get("version") != STATS_VERSION or data.get("source") != [st.st_mtime_ns, st.st_size]:
+        return None
+    return TableStats(data)
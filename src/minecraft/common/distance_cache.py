@@ -0,0 +1,153 @@
+"""
+Pairwise distance cache
+-----------------------
+
+Euclidean distances between all pairs of rows of a matrix (the standardized
+blocks), computed once per data hash and kept on disk as scipy's condensed
+vector (pdist order: (0, 1), (0, 2), ..., (n-2, n-1)) in float32. The file is
+memory-mapped, so the exact Ward tree (kmeans.py) and the silhouette
+(quality.py) read the same distances instead of each recomputing them.
+
+The vector holds n(n-1)/2 values: 10 000 blocks take 191 MB, 20 000 take
+763 MB. The size is reported before anything is computed, and above `max_mb`
+`open` returns None: the callers then stream the distances chunk by chunk.
+The default limit fits the largest table kmeans builds an exact Ward tree for
+(20 000 blocks, its HYBRID_MIN_ROWS). scipy's `linkage` works on float64: it
+copies the float32 vector it is given, so the Ward tree still allocates twice
+the cache size (1.5 GB for 20 000 blocks); only the distance computation is
+saved.
+
+Rows are computed in blocks, spread over the threads of the CPU budget
+(resources.py). Only the latest data is kept: building a cache removes the
+others of its directory.
+
+    cache = DistanceCache.open(Xstd, PathDistanceCache)
+    if cache is not None:
+        Z = linkage(cache.condensed, "ward")
+        block = cache.rows(np.arange(100))      # (100, n) distances
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from contextlib import nullcontext
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import resources
+
+if TYPE_CHECKING:
+    import numpy as np
+
+CACHE_VERSION = 1
+# room for the condensed distances of 20 000 blocks (763 MB)
+DEFAULT_MAX_MB = 768
+# float64 distances of one block of rows, before they are narrowed into the cache
+BLOCK_MB = 64
+
+
+def condensed_size(n: int) -> int:
+    return n * (n - 1) // 2
+
+
+def size_mb(n: int) -> float:
+    return condensed_size(n) * 4 / 2**20
+
+
+def data_hash(X: np.ndarray) -> str:
+    import numpy as np
+    h = hashlib.sha256()
+    h.update(json.dumps([CACHE_VERSION, str(X.dtype), X.shape]).encode())
+    h.update(np.ascontiguousarray(X).tobytes())
+    return h.hexdigest()[:16]
+
+
+def row_offsets(n: int) -> np.ndarray:
+    """Position in the condensed vector of the distance (i, i + 1), for every row i."""
+    import numpy as np
+    i = np.arange(n, dtype=np.int64)
+    return i * n - i * (i + 1) // 2
+
+
+def fill_rows(X: np.ndarray, sq: np.ndarray, out: np.ndarray, offsets: np.ndarray, start: int, stop: int):
+    """Distances from rows start..stop to the rows after each of them."""
+    import numpy as np
+    n = len(X)
+    d2 = sq[start:stop, None] + sq[None, start:] - 2.0 * (X[start:stop] @ X[start:].T)
+    dist = np.sqrt(np.maximum(d2, 0.0, out=d2), out=d2)
+    for r, i in enumerate(range(start, min(stop, n - 1))):
+        out[offsets[i]:offsets[i] + n - i - 1] = dist[r, r + 1:]
+
+
+def build(X: np.ndarray, path: Path, workers: int):
+    from concurrent.futures import ThreadPoolExecutor
+    import numpy as np
+    X = np.asarray(X, dtype=float)
+    n = len(X)
+    sq = np.einsum("ij,ij->i", X, X)
+    offsets = row_offsets(n)
+    rows = max(1, int(BLOCK_MB * 2**20 // (8 * n)))
+    blocks = [(start, min(n, start + rows)) for start in range(0, n - 1, rows)]
+    tmp = path.with_name(f".{path.stem}.{os.getpid()}.tmp.npy")
+    try:
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(condensed_size(n),))
+        if workers > 1:
+            # parallel blocks, each on one BLAS thread, rather than parallel BLAS calls on one block
+            try:
+                from threadpoolctl import threadpool_limits
+                limit = threadpool_limits(limits=1)
+            except ImportError:
+                limit = nullcontext()
+            with limit, ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(lambda b: fill_rows(X, sq, out, offsets, *b), blocks))
+        else:
+            for b in blocks:
+                fill_rows(X, sq, out, offsets, *b)
+        out.flush()
+        del out
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+class DistanceCache:
+    def __init__(self, condensed: np.ndarray, n: int, path: Path | None = None):
+        self.condensed = condensed
+        self.n = n
+        self.path = path
+        self.offsets = row_offsets(n)
+
+    @classmethod
+    def open(cls, X: np.ndarray, directory: Path, max_mb: float = DEFAULT_MAX_MB,
+             workers: int | None = None) -> DistanceCache | None:
+        """The cache of X, built if needed; None when it would exceed `max_mb` (stream the distances instead)."""
+        import numpy as np
+        n = len(X)
+        mb = size_mb(n)
+        if n < 2 or mb > max_mb:
+            print(f"[INFO] Distance cache: {n} blocks would need {mb:.1f} MB (limit {max_mb:g} MB), distances are streamed")
+            return None
+        path = directory / f"{data_hash(X)}.npy"
+        if path.exists():
+            print(f"[INFO] Distance cache: reusing {path} ({mb:.1f} MB)")
+        else:
+            print(f"[INFO] Distance cache: {condensed_size(n)} distances between {n} blocks, {mb:.1f} MB -> {path}")
+            directory.mkdir(parents=True, exist_ok=True)
+            build(X, path, workers or resources.thread_budget())
+            for old in directory.glob("*.npy"):
+                if old != path:
+                    old.unlink(missing_ok=True)
+        return cls(np.load(path, mmap_mode="r"), n, path)
+
+    def rows(self, idx: np.ndarray) -> np.ndarray:
+        """(len(idx), n) float64 distances from the rows `idx` to every row."""
+        import numpy as np
+        n = self.n
+        out = np.zeros((len(idx), n))
+        for r, i in enumerate(idx):
+            before = np.arange(i)
+            out[r, :i] = self.condensed[self.offsets[before] + i - before - 1]
+            out[r, i + 1:] = self.condensed[self.offsets[i]:self.offsets[i] + n - i - 1]
+        return out
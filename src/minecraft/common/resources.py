@@ -0,0 +1,131 @@
+"""
+CPU budget
+----------
+
+numpy/scipy (BLAS), sklearn (OpenMP) and our own process pools each size
+themselves to the whole machine, so running them together oversubscribes the
+cores. Every entry point takes one budget instead:
+
+    --jobs N      worker processes (pipeline stages, grid-search fits, ...)
+    --threads T   BLAS/OpenMP threads in each of them
+
+Given one of the two, the other is derived from the available cores
+(jobs x threads <= cores). `configure` applies the thread limit to the current
+process (environment variables, read when numpy loads, plus threadpoolctl when
+it is installed and the libraries are already loaded) and exports the
+per-process budget in MC_CPU_BUDGET, so a script started by the pipeline only
+splits the cores it was given.
+
+    p = argparse.ArgumentParser()
+    resources.add_arguments(p)
+    args = p.parse_args()
+    alloc = resources.configure(args.jobs, args.threads, default_jobs=4)
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from dataclasses import dataclass
+
+# cores handed down by a parent process (pipeline, batch, ...)
+BUDGET_ENV = "MC_CPU_BUDGET"
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS",
+                   "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+_limiter = None  # threadpoolctl limiter kept alive for the life of the process
+
+
+@dataclass(frozen=True)
+class Allocation:
+    cores: int
+    jobs: int
+    threads: int
+    source: str
+
+    @property
+    def oversubscribed(self) -> bool:
+        return self.jobs * self.threads > self.cores
+
+    def env(self) -> dict[str, str]:
+        """Environment of a worker process: its threads, and the budget its own children split."""
+        return {var: str(self.threads) for var in THREAD_ENV_VARS} | {BUDGET_ENV: str(self.threads)}
+
+    def describe(self) -> str:
+        text = f"{self.cores} cores ({self.source}): {self.jobs} process(es) x {self.threads} BLAS/OpenMP thread(s)"
+        if self.oversubscribed:
+            text += f" -- oversubscribed ({self.jobs * self.threads} threads)"
+        return text
+
+
+def available_cores() -> tuple[int, str]:
+    budget = os.environ.get(BUDGET_ENV)
+    if budget and budget.isdigit() and int(budget) > 0:
+        return int(budget), f"{BUDGET_ENV}"
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0)), "CPU affinity"
+    return os.cpu_count() or 1, "CPU count"
+
+
+def thread_budget() -> int:
+    """BLAS/OpenMP threads this process was given (all its cores when not configured)."""
+    threads = os.environ.get("OMP_NUM_THREADS", "")
+    return int(threads) if threads.isdigit() and int(threads) > 0 else available_cores()[0]
+
+
+def plan(jobs: int | None = None, threads: int | None = None, default_jobs: int = 1) -> Allocation:
+    cores, source = available_cores()
+    if jobs is None and threads is None:
+        jobs = max(1, min(default_jobs, cores))
+    if jobs is None:
+        jobs = max(1, cores // threads)
+    if threads is None:
+        threads = max(1, cores // jobs)
+    return Allocation(cores, max(1, jobs), max(1, threads), source)
+
+
+def apply(alloc: Allocation):
+    global _limiter
+    os.environ.update(alloc.env())
+    # the variables only act on libraries loaded after this point; already loaded ones are limited directly
+    if any(name in sys.modules for name in ("numpy", "scipy", "sklearn")):
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            return
+        _limiter = threadpool_limits(limits=alloc.threads)
+
+
+def positive_int(text: str) -> int:
+    """argparse type of --jobs and --threads: 0 or a negative count would leave no core to run on."""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {text!r}")
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+
+def add_arguments(parser: argparse.ArgumentParser, jobs: bool = True, jobs_help: str = "Worker processes",
+                  jobs_default: str = "1"):
+    if jobs:
+        parser.add_argument("--jobs", "-j", type=positive_int, default=None,
+                            help=f"{jobs_help} (default: {jobs_default}, or available cores / --threads)")
+    parser.add_argument("--threads", type=positive_int, default=None,
+                        help="BLAS/OpenMP threads per process (default: available cores / jobs)")
+
+
+def configure(jobs: int | None = None, threads: int | None = None, default_jobs: int = 1,
+              quiet: bool = False) -> Allocation:
+    alloc = plan(jobs, threads, default_jobs)
+    apply(alloc)
+    if not quiet:
+        print(f"[INFO] Resources: {alloc.describe()}")
+    return alloc
+
+
+def worker_init(threads: int):
+    """ProcessPoolExecutor initializer: limits the worker's threads, even if it inherited loaded libraries."""
+    apply(Allocation(threads, 1, threads, BUDGET_ENV))
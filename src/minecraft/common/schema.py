@@ -0,0 +1,111 @@
+"""
+Clean dataset schema
+--------------------
+
+Single declaration of the columns of the clean block table
+(`blocklist_clean.csv`) and of its encoded form (`clustering/results/clean.csv`):
+names, types, separator and the ordered levels of the qualitative columns.
+
+`read_clean` parses such a file exactly once with explicit dtypes, optionally
+in chunks, through pyarrow's CSV reader when it is installed.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SEP = ";"
+ENCODING = "utf-8"
+
+NAME_COLUMN = "block"
+INT_COLUMNS = ["number_of_variants", "height_external", "width_external", "volume"]
+FLOAT_COLUMNS = ["blast_resistance", "luminance"]
+NUMERIC_COLUMNS = INT_COLUMNS + FLOAT_COLUMNS
+
+# Ordered levels; a level's position is its ordinal code in the encoded table
+LEVELS: dict[str, tuple[str, ...]] = {
+    "conductive": ("No", "Maybe", "Yes"),
+    "full_cube": ("No", "Maybe", "Yes"),
+    "spawnable": ("No", "Fire-Immune Mobs Only", "Ocelots and Parrots Only", "Polar Bear Only", "Maybe", "Yes"),
+    "movable": ("No", "Breaks", "Maybe", "Yes"),
+}
+CATEGORICAL_COLUMNS = list(LEVELS)
+
+COLUMNS = [NAME_COLUMN] + NUMERIC_COLUMNS + CATEGORICAL_COLUMNS
+
+# Optional pyarrow CSV reader; only looked up here, imported by pandas on first read
+FAST_ENGINE: str | None = "pyarrow" if importlib.util.find_spec("pyarrow") else None
+
+# spellings of a missing value in the data columns; block names such as "NA" or "None" are kept as names
+NA_VALUES = ["", "NA", "N/A", "n/a", "NaN", "nan", "-NaN", "-nan", "NULL", "null", "None", "<NA>", "#N/A"]
+
+
+def codes(column: str) -> dict[str, int]:
+    return {level: i for i, level in enumerate(LEVELS[column])}
+
+
+def dtypes(encoded: bool = False, compact: bool = False) -> dict[str, str]:
+    """
+    Column dtypes of the clean table. `encoded` reads qualitative columns as their
+    ordinal codes instead of labels; `compact` uses float32 features and int8 codes.
+    """
+    result = {NAME_COLUMN: "str"}
+    result |= {c: "float32" if compact else "int64" for c in INT_COLUMNS}
+    result |= {c: "float32" if compact else "float64" for c in FLOAT_COLUMNS}
+    if encoded:
+        result |= {c: "int8" if compact else "int64" for c in CATEGORICAL_COLUMNS}
+    else:
+        result |= {c: "category" if compact else "str" for c in CATEGORICAL_COLUMNS}
+    return result
+
+
+def header(path: Path, sep: str = SEP) -> list[str]:
+    with open(path, encoding=ENCODING) as f:
+        return [c.strip() for c in f.readline().rstrip("\r\n").split(sep)]
+
+
+def sniff_sep(path: Path, candidates: str = ";,\t|") -> str:
+    """Separator splitting the header line into the most fields, read from the first line only."""
+    with open(path, encoding=ENCODING) as f:
+        line = f.readline()
+    return max(candidates, key=line.count)
+
+
+def read_clean(path: Path, encoded: bool = False, compact: bool = False, chunksize: int | None = None,
+               usecols: list[str] | None = None, extra_dtypes: dict[str, str] | None = None,
+               sep: str = SEP) -> pd.DataFrame | Iterator[pd.DataFrame]:
+    """
+    Parse a clean block table once, with the schema's dtypes.
+
+    Column names are stripped and checked against the schema; columns outside it
+    (such as `cluster`) are kept with the dtype given in `extra_dtypes`, or inferred.
+    With `chunksize`, returns an iterator of frames instead of one frame.
+    """
+    import pandas as pd
+
+    names = header(path, sep)
+    missing = [c for c in COLUMNS if c not in names]
+    if missing:
+        raise ValueError(f"{path}: missing columns {', '.join(missing)}")
+    types = {c: t for c, t in (dtypes(encoded, compact) | (extra_dtypes or {})).items() if c in names}
+    # pyarrow parses in parallel but cannot stream chunks
+    fast = chunksize is None and FAST_ENGINE is not None
+    if fast:
+        # pyarrow takes a single NA list for every column: block is fixed below
+        options = {"engine": FAST_ENGINE, "na_values": NA_VALUES}
+    else:
+        # round_trip parses floats exactly, as pyarrow does, so both paths give the same values
+        options = {"engine": "c", "chunksize": chunksize, "float_precision": "round_trip",
+                   "na_values": {c: NA_VALUES for c in names if c != NAME_COLUMN}}
+    df = pd.read_csv(path, sep=sep, header=0, names=names, dtype=types, usecols=usecols,
+                     encoding=ENCODING, keep_default_na=False, **options)
+    if fast and NAME_COLUMN in df.columns and df[NAME_COLUMN].isna().any():
+        # a name parsed as missing ("NA", "None", ...): read the names again, as text only
+        df[NAME_COLUMN] = pd.read_csv(path, sep=sep, header=0, names=names, usecols=[NAME_COLUMN], dtype=str,
+                                      keep_default_na=False, encoding=ENCODING, engine="c")[NAME_COLUMN].to_numpy()
+    return df
@@ -0,0 +1,151 @@
+"""
+Shared feature matrix
+---------------------
+
+Publishes a numeric matrix (typically the standardized features) and the
+matching row names (block names) once, in shared memory or in a memory-mapped
+file, so worker processes attach to the same pages instead of each receiving a
+pickled copy.
+
+    with SharedMatrix(Xstd, names) as shared:
+        with ProcessPoolExecutor(initializer=init, initargs=(shared.handle,)) as pool:
+            ...
+
+    def init(handle):
+        global X
+        X, names = attach(handle)   # read-only views, no copy
+
+The owner (the `with` block) frees the segment or deletes the file on exit;
+workers only close their mappings. Shared memory is used by default, and a
+temporary file when shared memory is unavailable or `backend="memmap"`.
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import sys
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Sequence
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+@dataclass(frozen=True)
+class ArrayHandle:
+    """Where a published array lives; small and picklable."""
+    backend: str      # "shm" or "memmap"
+    location: str     # segment name or file path
+    shape: tuple[int, ...]
+    dtype: str
+
+
+@dataclass(frozen=True)
+class MatrixHandle:
+    matrix: ArrayHandle
+    names: ArrayHandle | None
+
+
+def _publish(array: np.ndarray, backend: str, directory: Path | None):
+    """Copy `array` into a new shared segment or file; returns (handle, owner resource)."""
+    import numpy as np
+    array = np.ascontiguousarray(array)
+    if backend == "shm":
+        from multiprocessing import shared_memory
+        segment = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(array.shape, array.dtype, buffer=segment.buf)[...] = array
+        return ArrayHandle("shm", segment.name, array.shape, array.dtype.str), segment
+    fd, path = tempfile.mkstemp(prefix="mc_matrix_", suffix=".npy", dir=directory)
+    os.close(fd)
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=array.dtype, shape=array.shape)
+    out[...] = array
+    out.flush()
+    del out
+    return ArrayHandle("memmap", path, array.shape, array.dtype.str), Path(path)
+
+
+# mappings opened by attach() in this process, kept alive as long as the views
+_attached: dict[str, object] = {}
+
+
+def _attach(handle: ArrayHandle) -> np.ndarray:
+    import numpy as np
+    if handle.backend == "memmap":
+        view = np.load(handle.location, mmap_mode="r")
+        _attached[handle.location] = view
+        return view
+    from multiprocessing import shared_memory
+    segment = _attached.get(handle.location)
+    if segment is None:
+        # on 3.13+ the attaching side must not register the segment: only the owner unlinks it
+        kwargs = {"track": False} if sys.version_info >= (3, 13) else {}
+        segment = shared_memory.SharedMemory(name=handle.location, **kwargs)
+        _attached[handle.location] = segment
+    view = np.ndarray(handle.shape, np.dtype(handle.dtype), buffer=segment.buf)
+    view.flags.writeable = False
+    return view
+
+
+def attach(handle: MatrixHandle) -> tuple[np.ndarray, np.ndarray | None]:
+    """Read-only views of a published matrix and its row names, valid for the life of the process."""
+    return _attach(handle.matrix), _attach(handle.names) if handle.names else None
+
+
+class SharedMatrix:
+    """Owner of a published matrix; use as a context manager, or call `close()`."""
+
+    def __init__(self, matrix: np.ndarray, names: Sequence[str] | None = None,
+                 backend: str = "shm", directory: Path | None = None):
+        import numpy as np
+        if backend not in ("shm", "memmap"):
+            raise ValueError(f"unknown backend {backend!r}")
+        self._resources: list = []
+        try:
+            matrix_handle = self._publish(matrix, backend, directory)
+            names_handle = self._publish(np.asarray(names, dtype=str), backend, directory) if names is not None else None
+        except BaseException:
+            self.close()
+            raise
+        self.handle = MatrixHandle(matrix_handle, names_handle)
+        # a crash between publish and close must not leave segments in /dev/shm or files in /tmp
+        atexit.register(self.close)
+
+    def _publish(self, array: np.ndarray, backend: str, directory: Path | None) -> ArrayHandle:
+        if backend == "shm":
+            try:
+                handle, resource = _publish(array, "shm", directory)
+            except OSError:
+                # no /dev/shm or not enough room: fall back to a file
+                handle, resource = _publish(array, "memmap", directory)
+        else:
+            handle, resource = _publish(array, "memmap", directory)
+        self._resources.append(resource)
+        return handle
+
+    @property
+    def nbytes(self) -> int:
+        import numpy as np
+        return sum(int(np.prod(h.shape)) * np.dtype(h.dtype).itemsize
+                   for h in (self.handle.matrix, self.handle.names) if h)
+
+    def close(self):
+        while self._resources:
+            resource = self._resources.pop()
+            if isinstance(resource, Path):
+                resource.unlink(missing_ok=True)
+            else:
+                resource.close()
+                try:
+                    resource.unlink()
+                except FileNotFoundError:
+                    pass
+        atexit.unregister(self.close)
+
+    def __enter__(self) -> SharedMatrix:
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,185 @@
+"""
+Streaming statistics
+--------------------
+
+One-pass, mergeable summaries of a stream of row chunks:
+
+- `RunningStats`: count, mean, variance, min and max per column (Welford's
+  update, chunks combined with Chan et al.'s parallel formula);
+- `QuantileSketch`: approximate quantiles of one column in bounded memory
+  (KLL-style compactors, exact while fewer than `k` values were seen);
+- `GroupedStats`: both, per group label (e.g. per cluster).
+
+Every summary can `merge` another one built on a different part of the data,
+so partial results from parallel workers combine into the result of a single
+pass over all the rows.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class RunningStats:
+    """Per-column count, mean, sum of squared deviations, min and max."""
+
+    def __init__(self, n_columns: int):
+        import numpy as np
+        self.count = 0
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.min = np.full(n_columns, np.inf)
+        self.max = np.full(n_columns, -np.inf)
+
+    def update(self, X: np.ndarray):
+        import numpy as np
+        if len(X) == 0:
+            return
+        X = np.asarray(X, dtype=float)
+        chunk = RunningStats(X.shape[1])
+        chunk.count = len(X)
+        chunk.mean = X.mean(axis=0)
+        chunk.m2 = ((X - chunk.mean) ** 2).sum(axis=0)
+        chunk.min = X.min(axis=0)
+        chunk.max = X.max(axis=0)
+        self.merge(chunk)
+
+    def merge(self, other: RunningStats):
+        import numpy as np
+        if other.count == 0:
+            return
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / n)
+        self.m2 = self.m2 + other.m2 + delta ** 2 * (self.count * other.count / n)
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self.count = n
+
+    def variance(self, ddof: int = 1) -> np.ndarray:
+        import numpy as np
+        if self.count <= ddof:
+            return np.full_like(self.mean, np.nan)
+        return self.m2 / (self.count - ddof)
+
+    def std(self, ddof: int = 1) -> np.ndarray:
+        import numpy as np
+        return np.sqrt(self.variance(ddof))
+
+
+class QuantileSketch:
+    """
+    Approximate quantiles of one column.
+
+    Values are kept in levels; a value at level h stands for 2**h values. When a
+    level outgrows its capacity it is sorted and every other value (random
+    offset) moves up one level. Memory stays O(k log(n/k)) and the rank error
+    is about 1/k of n.
+    """
+
+    def __init__(self, k: int = 200, seed: int = 0):
+        import numpy as np
+        self.k = k
+        self.count = 0
+        self.levels: list[np.ndarray] = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        # lower levels get smaller buffers, the top one holds k values
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _compress(self):
+        import numpy as np
+        level = 0
+        while level < len(self.levels):
+            buf = self.levels[level]
+            if len(buf) <= self._capacity(level):
+                level += 1
+                continue
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            buf = np.sort(buf)
+            even = len(buf) - len(buf) % 2
+            promoted = buf[self.rng.integers(2):even:2]
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            self.levels[level] = buf[even:]
+            # adding a level shrinks the capacity of the ones below: check them again
+            level = 0
+
+    def update(self, values: np.ndarray):
+        import numpy as np
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: QuantileSketch):
+        import numpy as np
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, buf in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], buf])
+        self.count += other.count
+        self._compress()
+
+    def quantiles(self, qs: Iterable[float]) -> np.ndarray:
+        import numpy as np
+        qs = np.asarray(list(qs), dtype=float)
+        if self.count == 0:
+            return np.full(len(qs), np.nan)
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(buf), 2.0 ** level) for level, buf in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        values, cumulative = values[order], np.cumsum(weights[order])
+        # smallest retained value whose weighted rank reaches q
+        ranks = np.searchsorted(cumulative, qs * cumulative[-1], side="left")
+        return values[np.minimum(ranks, len(values) - 1)]
+
+
+class GroupedStats:
+    """`RunningStats` and one `QuantileSketch` per column, for every group label."""
+
+    def __init__(self, n_columns: int, k: int = 200, seed: int = 0):
+        self.n_columns = n_columns
+        self.k = k
+        self.seed = seed
+        self.stats: dict[int, RunningStats] = {}
+        self.sketches: dict[int, list[QuantileSketch]] = {}
+
+    def _group(self, label: int) -> tuple[RunningStats, list[QuantileSketch]]:
+        if label not in self.stats:
+            self.stats[label] = RunningStats(self.n_columns)
+            self.sketches[label] = [QuantileSketch(self.k, self.seed + j) for j in range(self.n_columns)]
+        return self.stats[label], self.sketches[label]
+
+    def update(self, X: np.ndarray, labels: np.ndarray):
+        import numpy as np
+        X = np.asarray(X, dtype=float)
+        labels = np.asarray(labels)
+        # one stable sort, then contiguous slices per label
+        order = np.argsort(labels, kind="stable")
+        groups, starts = np.unique(labels[order], return_index=True)
+        for label, rows in zip(groups.tolist(), np.split(order, starts[1:])):
+            stats, sketches = self._group(label)
+            block = X[rows]
+            stats.update(block)
+            for j, sketch in enumerate(sketches):
+                sketch.update(block[:, j])
+
+    def merge(self, other: GroupedStats):
+        for label, stats in other.stats.items():
+            own_stats, own_sketches = self._group(label)
+            own_stats.merge(stats)
+            for own, sketch in zip(own_sketches, other.sketches[label]):
+                own.merge(sketch)
+
+    def labels(self) -> list[int]:
+        return sorted(self.stats)
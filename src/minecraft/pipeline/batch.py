@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Batch analysis of dataset snapshots
+-----------------------------------
+
+Runs the whole pipeline (cleaning, clustering, ACP, ACM, AFC) for every
+`blocklist.json` snapshot of a directory, each in its own output namespace:
+
+  <out>/<snapshot>/dataset/     clean JSON and CSV
+  <out>/<snapshot>/clustering/  clustering results
+  <out>/<snapshot>/acp|acm|afc/ factor analyses
+
+The stages of all snapshots form one DAG, so `--jobs` stages run at the same
+time across snapshots, each with `--threads` BLAS/OpenMP threads. Incremental
+runs work as in pipeline.py: a snapshot whose file did not change is skipped.
+
+A snapshot is either a `<name>.json` file or a `<name>/blocklist.json` directory.
+The cross-snapshot summary (`summary.csv`) lists, per snapshot, the sorted
+cluster sizes, the ACP eigenvalues and their drift from the reference
+snapshot, and the categorical pair chosen by the AFC.
+
+Usage:
+  python batch.py snapshots/ --out batch_outputs --jobs 8
+"""
+
+import argparse
+import csv
+import time
+from pathlib import Path
+
+from pipeline import Pipeline, report
+import resources
+from stages import Layout, Stage, default_stages
+
+
+def find_snapshots(directory: Path) -> dict[str, Path]:
+    snapshots = {}
+    for entry in sorted(directory.iterdir()):
+        if entry.is_file() and entry.suffix == ".json":
+            snapshots[entry.stem] = entry
+        elif entry.is_dir() and (entry / "blocklist.json").is_file():
+            snapshots[entry.name] = entry / "blocklist.json"
+    return snapshots
+
+
+def snapshot_layout(raw_json: Path, out: Path) -> Layout:
+    return Layout(
+        raw_json=raw_json.resolve(),
+        clean_json=out / "dataset" / "blocklist_clean.json",
+        clean_csv=out / "dataset" / "blocklist_clean.csv",
+        results=out / "clustering",
+        acp_out=out / "acp",
+        acm_out=out / "acm",
+        afc_out=out / "afc",
+    )
+
+
+def namespaced_stages(name: str, layout: Layout) -> list[Stage]:
+    stages = default_stages(layout)
+    for s in stages:
+        s.name = f"{name}/{s.name}"
+    return stages
+
+
+# ---- summary ----
+
+def cluster_sizes(path: Path) -> list[int]:
+    counts: dict[str, int] = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f, delimiter=";"):
+            counts[row["cluster"]] = counts.get(row["cluster"], 0) + 1
+    # cluster numbers are arbitrary from one fit to the next, only the sizes compare
+    return sorted(counts.values(), reverse=True)
+
+
+def eigenvalues(path: Path) -> list[float]:
+    with open(path, newline="", encoding="utf-8") as f:
+        return [float(row["Valeur propre"]) for row in csv.DictReader(f)]
+
+
+def afc_selection(path: Path) -> dict[str, str]:
+    pairs = (line.split("=", 1) for line in path.read_text(encoding="utf-8").splitlines() if "=" in line)
+    return {k: v for k, v in pairs}
+
+
+def summarize(layouts: dict[str, Layout], reference: str, out: Path) -> Path:
+    rows = []
+    ref_ev = None
+    ref_layout = layouts.get(reference)
+    if ref_layout and (ref_layout.acp_out / "acp_valeurs_propres.csv").exists():
+        ref_ev = eigenvalues(ref_layout.acp_out / "acp_valeurs_propres.csv")
+    n_dims = 0
+    for name, layout in layouts.items():
+        row: dict[str, object] = {"snapshot": name}
+        clusters = layout.results / "data_with_clusters.csv"
+        if clusters.exists():
+            sizes = cluster_sizes(clusters)
+            row["blocks"] = sum(sizes)
+            row["cluster_sizes"] = "|".join(map(str, sizes))
+        ev_path = layout.acp_out / "acp_valeurs_propres.csv"
+        if ev_path.exists():
+            ev = eigenvalues(ev_path)
+            n_dims = max(n_dims, len(ev))
+            for i, v in enumerate(ev):
+                row[f"eigenvalue_{i + 1}"] = round(v, 6)
+            if ref_ev:
+                # largest change of one eigenvalue, relative to the reference snapshot
+                row["eigenvalue_drift"] = round(max((abs(a - b) / b for a, b in zip(ev, ref_ev) if b), default=0.0), 6)
+        selection = layout.afc_out / "auto_selection.txt"
+        if selection.exists():
+            sel = afc_selection(selection)
+            row |= {"afc_x": sel.get("x"), "afc_y": sel.get("y"), "afc_p_value": sel.get("p_value")}
+        rows.append(row)
+
+    columns = ["snapshot", "blocks", "cluster_sizes"] + [f"eigenvalue_{i + 1}" for i in range(n_dims)] \
+        + ["eigenvalue_drift", "afc_x", "afc_y", "afc_p_value"]
+    path = out / "summary.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, delimiter=";")
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Run the full analysis for every dataset snapshot of a directory.")
+    p.add_argument("snapshots", type=Path, help="Directory of <name>.json or <name>/blocklist.json snapshots")
+    p.add_argument("--out", type=Path, default=Path("batch_outputs"), help="Output root, one sub-directory per snapshot (default: ./batch_outputs)")
+    resources.add_arguments(p, jobs_help="Stages run at the same time", jobs_default="CPU count")
+    p.add_argument("--reference", default=None, help="Snapshot the eigenvalue drift is measured against (default: first by name)")
+    p.add_argument("--force", action="store_true", help="Rerun stages even when they are up to date")
+    args = p.parse_args()
+    # many independent small stages: one core per stage unless --threads asks otherwise
+    alloc = resources.configure(args.jobs, args.threads, default_jobs=resources.available_cores()[0])
+
+    snapshots = find_snapshots(args.snapshots)
+    if not snapshots:
+        print(f"[ERROR] No snapshot found in {args.snapshots}")
+        return 2
+    out = args.out.resolve()
+    layouts = {name: snapshot_layout(raw, out / name) for name, raw in snapshots.items()}
+    stages = [s for name, layout in layouts.items() for s in namespaced_stages(name, layout)]
+    pipeline = Pipeline(stages, out / ".state")
+    print(f"[INFO] {len(snapshots)} snapshots, {len(stages)} stages, {alloc.jobs} at a time")
+
+    start = time.perf_counter()
+    results = pipeline.run(jobs=alloc.jobs, force=args.force)
+    report(pipeline, results, time.perf_counter() - start)
+
+    summary = summarize(layouts, args.reference or next(iter(layouts)), out)
+    print(f"[INFO] Wrote {summary}")
+    return 0 if all(r.status in ("ran", "skipped") for r in results.values()) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
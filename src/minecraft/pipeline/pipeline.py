@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Analysis pipeline runner
+------------------------
+
+Runs the cleaning, clustering, ACP, ACM and AFC scripts as a DAG of stages.
+A stage depends on the stages producing its inputs; independent branches run
+concurrently, and a stage whose inputs, script and arguments did not change
+since its last successful run is skipped.
+
+Each stage runs in its own interpreter, from its script directory, with its
+output captured in .state/logs/<stage>.log. The cores are shared between the
+stages running at the same time (--jobs) and the BLAS/OpenMP threads of each
+(--threads), see common/resources.py.
+
+Usage:
+  python pipeline.py                 # refresh everything that is out of date
+  python pipeline.py --jobs 4 acp    # refresh acp and what it depends on
+  python pipeline.py --threads 2     # 2 BLAS threads per stage, as many stages as fit
+  python pipeline.py --dry-run       # show the plan and the expected critical path
+  python pipeline.py --force         # rerun every stage
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from stages import Layout, Stage, default_stages
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "common"))
+import resources
+
+
+@dataclass
+class StageResult:
+    name: str
+    status: str  # ran, skipped, failed, blocked
+    duration: float = 0.0
+
+
+def run_subprocess(stage: Stage, log: Path) -> int:
+    """Run a stage in a fresh interpreter, from its script directory."""
+    env = {**os.environ, "MPLBACKEND": "Agg", **stage.env}
+    with open(log, "w", encoding="utf-8") as f:
+        proc = subprocess.run([sys.executable, str(stage.script), *stage.args],
+                              cwd=stage.cwd, env=env, stdout=f, stderr=subprocess.STDOUT)
+    return proc.returncode
+
+
+class Pipeline:
+    def __init__(self, stages: list[Stage], state_dir: Path, runner: Callable[[Stage, Path], int] = run_subprocess):
+        self.stages = {s.name: s for s in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Duplicate stage names")
+        self.state_dir = state_dir
+        self.runner = runner
+        self.deps = self._dependencies()
+        self.order = self._toposort()
+
+    def _dependencies(self) -> dict[str, set[str]]:
+        producers: dict[Path, str] = {}
+        for s in self.stages.values():
+            for out in s.outputs:
+                if out in producers:
+                    raise ValueError(f"{out} is produced by both {producers[out]} and {s.name}")
+                producers[out] = s.name
+        return {s.name: {producers[i] for i in s.inputs if i in producers} for s in self.stages.values()}
+
+    def _toposort(self) -> list[str]:
+        order: list[str] = []
+        state: dict[str, int] = {}  # 1 = visiting, 2 = done
+
+        def visit(name: str):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Dependency cycle through {name}")
+            state[name] = 1
+            for d in sorted(self.deps[name]):
+                visit(d)
+            state[name] = 2
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def ancestors(self, targets: list[str]) -> set[str]:
+        seen: set[str] = set()
+        todo = list(targets)
+        while todo:
+            name = todo.pop()
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage: {name}")
+            if name not in seen:
+                seen.add(name)
+                todo.extend(self.deps[name])
+        return seen
+
+    # ---- staleness ----
+
+    def _stamp_path(self, stage: Stage) -> Path:
+        return self.state_dir / "stamps" / f"{stage.name}.json"
+
+    def _log_path(self, stage: Stage) -> Path:
+        return self.state_dir / "logs" / f"{stage.name}.log"
+
+    @staticmethod
+    def _signature(stage: Stage) -> dict:
+        def sig(p: Path):
+            try:
+                st = p.stat()
+                return [st.st_mtime_ns, st.st_size]
+            except FileNotFoundError:
+                return None
+        return {
+            "script": sig(stage.script),
+            "inputs": {str(p): sig(p) for p in stage.inputs},
+            "args": stage.args,
+            "env": stage.env,
+        }
+
+    def read_stamp(self, stage: Stage) -> dict | None:
+        try:
+            return json.loads(self._stamp_path(stage).read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def up_to_date(self, stage: Stage) -> bool:
+        stamp = self.read_stamp(stage)
+        if stamp is None or stamp.get("signature") != self._signature(stage):
+            return False
+        return all(p.exists() for p in stage.outputs)
+
+    def missing_inputs(self, stage: Stage) -> list[Path]:
+        return [p for p in stage.inputs if not p.exists()]
+
+    # ---- execution ----
+
+    def run_stage(self, stage: Stage) -> int:
+        log = self._log_path(stage)
+        log.parent.mkdir(parents=True, exist_ok=True)
+        for out in stage.outputs:
+            out.parent.mkdir(parents=True, exist_ok=True)
+        return self.runner(stage, log)
+
+    def _execute(self, stage: Stage, force: bool) -> StageResult:
+        if not force and self.up_to_date(stage):
+            return StageResult(stage.name, "skipped")
+        missing = self.missing_inputs(stage)
+        if missing:
+            print(f"[ERROR] {stage.name}: missing input {missing[0]}", file=sys.stderr)
+            return StageResult(stage.name, "failed")
+        print(f"[INFO] Starting {stage.name}")
+        start = time.perf_counter()
+        code = self.run_stage(stage)
+        duration = time.perf_counter() - start
+        if code != 0:
+            print(f"[ERROR] {stage.name} exited with {code}, see {self._log_path(stage)}", file=sys.stderr)
+            return StageResult(stage.name, "failed", duration)
+        stamp = self._stamp_path(stage)
+        stamp.parent.mkdir(parents=True, exist_ok=True)
+        stamp.write_text(json.dumps({"signature": self._signature(stage), "duration": duration}), encoding="utf-8")
+        return StageResult(stage.name, "ran", duration)
+
+    def run(self, targets: list[str] | None = None, jobs: int = 4, force: bool = False) -> dict[str, StageResult]:
+        selected = self.ancestors(targets) if targets else set(self.stages)
+        pending = [n for n in self.order if n in selected]
+        results: dict[str, StageResult] = {}
+        running: dict[Future, str] = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            while pending or running:
+                for name in list(pending):
+                    deps = self.deps[name] & selected
+                    if any(results.get(d) and results[d].status in ("failed", "blocked") for d in deps):
+                        results[name] = StageResult(name, "blocked")
+                        pending.remove(name)
+                    elif all(d in results for d in deps):
+                        running[pool.submit(self._execute, self.stages[name], force)] = name
+                        pending.remove(name)
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    res = fut.result()
+                    results[running.pop(fut)] = res
+                    print(f"[INFO] {res.name}: {res.status} ({res.duration:.2f}s)")
+        return results
+
+    # ---- reporting ----
+
+    def critical_path(self, durations: dict[str, float]) -> tuple[list[str], float]:
+        """Longest chain of dependent stages, weighted by `durations`."""
+        finish: dict[str, float] = {}
+        prev: dict[str, str | None] = {}
+        for name in self.order:
+            if name not in durations:
+                continue
+            best = max((d for d in self.deps[name] if d in finish), key=lambda d: finish[d], default=None)
+            finish[name] = durations[name] + (finish[best] if best else 0.0)
+            prev[name] = best
+        if not finish:
+            return [], 0.0
+        node: str | None = max(finish, key=lambda n: finish[n])
+        total = finish[node]
+        path = []
+        while node is not None:
+            path.append(node)
+            node = prev[node]
+        return path[::-1], total
+
+    def estimated_durations(self, names) -> dict[str, float]:
+        """Duration of the last successful run of each stage (0 when unknown)."""
+        est = {}
+        for name in names:
+            stamp = self.read_stamp(self.stages[name])
+            est[name] = stamp.get("duration", 0.0) if stamp else 0.0
+        return est
+
+
+def report(pipeline: Pipeline, results: dict[str, StageResult], wall: float):
+    print("\n=== Pipeline report ===")
+    for name in pipeline.order:
+        if name in results:
+            r = results[name]
+            print(f"{name:<20} {r.status:<8} {r.duration:7.2f}s")
+    ran = {n: r.duration for n, r in results.items() if r.status in ("ran", "failed")}
+    path, length = pipeline.critical_path(ran)
+    print(f"\nWall time: {wall:.2f}s, sum of stage times: {sum(ran.values()):.2f}s")
+    if path:
+        print(f"Critical path ({length:.2f}s): {' -> '.join(path)}")
+    cold_path, cold_length = pipeline.critical_path(pipeline.estimated_durations(results))
+    if cold_path:
+        print(f"Critical path of a full refresh (last known timings, {cold_length:.2f}s): {' -> '.join(cold_path)}")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Run the Minecraft blocks analysis as a DAG of stages.")
+    p.add_argument("targets", nargs="*", help="Stages to bring up to date, with their prerequisites (default: all)")
+    resources.add_arguments(p, jobs_help="Stages run at the same time", jobs_default="4")
+    p.add_argument("--force", action="store_true", help="Rerun stages even when they are up to date")
+    p.add_argument("--dry-run", action="store_true", help="Only print the stages that would run")
+    p.add_argument("--list", action="store_true", help="List stages with their dependencies and exit")
+    return p.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    layout = Layout()
+    pipeline = Pipeline(default_stages(layout), layout.state)
+
+    if args.list:
+        for name in pipeline.order:
+            deps = ", ".join(sorted(pipeline.deps[name])) or "-"
+            print(f"{name:<20} <- {deps}")
+        return 0
+
+    if args.dry_run:
+        selected = pipeline.ancestors(args.targets) if args.targets else set(pipeline.stages)
+        stale: set[str] = set()
+        for name in pipeline.order:
+            if name in selected:
+                if args.force or pipeline.deps[name] & stale or not pipeline.up_to_date(pipeline.stages[name]):
+                    stale.add(name)
+                print(f"{name:<20} {'run' if name in stale else 'up to date'}")
+        path, length = pipeline.critical_path(pipeline.estimated_durations(selected))
+        if path:
+            print(f"\nCritical path ({length:.2f}s from last known timings): {' -> '.join(path)}")
+        return 0
+
+    # the stages inherit their share of the cores through the environment
+    alloc = resources.configure(args.jobs, args.threads, default_jobs=4)
+    start = time.perf_counter()
+    results = pipeline.run(args.targets, jobs=alloc.jobs, force=args.force)
+    report(pipeline, results, time.perf_counter() - start)
+    return 0 if all(r.status in ("ran", "skipped") for r in results.values()) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,95 @@
+"""
+Pipeline stages
+---------------
+
+Declares every analysis script as a stage with explicit inputs and outputs.
+Paths are always absolute so that a stage does not depend on the directory
+the operator launched the pipeline from.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent
+ROOT = SRC.parent.parent
+DATASET_DIR = ROOT / "datasets" / "minecraft" / "blocks"
+
+SCATTER_PAIRS = [
+    ("width_external", "height_external"),
+    ("width_external", "volume"),
+    ("height_external", "volume"),
+    ("number_of_variants", "luminance"),
+    ("number_of_variants", "blast_resistance"),
+    ("luminance", "blast_resistance"),
+]
+
+
+@dataclass
+class Stage:
+    name: str
+    script: Path
+    inputs: list[Path]
+    outputs: list[Path]
+    args: list[str] = field(default_factory=list)
+    env: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def cwd(self) -> Path:
+        return self.script.parent
+
+
+@dataclass
+class Layout:
+    """Where a pipeline run reads its dataset and writes its artifacts."""
+    raw_json: Path = DATASET_DIR / "blocklist.json"
+    clean_json: Path = DATASET_DIR / "blocklist_clean.json"
+    clean_csv: Path = DATASET_DIR / "blocklist_clean.csv"
+    results: Path = SRC / "clustering" / "results"
+    acp_out: Path = SRC / "acp" / "acp_outputs"
+    acm_out: Path = SRC / "acm" / "acm_outputs"
+    afc_out: Path = SRC / "afc" / "afc_outputs"
+    state: Path = SRC / "pipeline" / ".state"
+
+
+def default_stages(layout: Layout = Layout()) -> list[Stage]:
+    r = layout.results
+    results_env = {"MC_CLUSTERING_RESULTS": str(r)}
+    return [
+        # one pass over the raw list writes the clean JSON, the clean CSV and the encoded CSV
+        Stage("export_clean", SRC / "blocks" / "export_clean.py",
+              inputs=[layout.raw_json], outputs=[layout.clean_json, layout.clean_csv, r / "clean.csv"],
+              args=["--input", str(layout.raw_json), "--json", str(layout.clean_json),
+                    "--csv", str(layout.clean_csv), "--encoded", str(r / "clean.csv")]),
+        Stage("kmeans", SRC / "clustering" / "kmeans.py",
+              inputs=[r / "clean.csv"],
+              outputs=[r / "data_with_clusters.csv", r / "cluster_profiles.csv", r / "hierarchical_clusters.csv", r / "dendogram.png",
+                       r / "kmeans_model.npz"],
+              env=results_env),
+        Stage("quality", SRC / "clustering" / "quality.py",
+              inputs=[r / "data_with_clusters.csv", r / "kmeans_model.npz"],
+              outputs=[r / "cluster_quality.csv", r / "cluster_quality_summary.csv", r / "block_silhouette.csv"],
+              env=results_env),
+        Stage("cluster_pca", SRC / "clustering" / "cluster_pca.py",
+              inputs=[r / "data_with_clusters.csv", r / "kmeans_model.npz"],
+              outputs=[r / "cluster_pca.csv"], env=results_env),
+        Stage("plot_clusters", SRC / "clustering" / "plot_clusters.py",
+              inputs=[r / "data_with_clusters.csv"],
+              outputs=[r / f"clustering-scatter-of-{y}-by-{x}.png" for x, y in SCATTER_PAIRS],
+              env=results_env),
+        Stage("separate_clusters", SRC / "clustering" / "separate_clusters.py",
+              inputs=[r / "data_with_clusters.csv"], outputs=[], env=results_env),
+        Stage("acp", SRC / "acp" / "acp_blocks.py",
+              inputs=[layout.clean_json],
+              outputs=[layout.acp_out / "acp_valeurs_propres.csv", layout.acp_out / "acp_scores.csv",
+                       layout.acp_out / "acp_loadings.csv", layout.acp_out / "acp_analyse_parallele.csv",
+                       layout.acp_out / "acp_model.npz"],
+              args=["--file", str(layout.clean_json), "--out", str(layout.acp_out)]),
+        # ACM timestamps its artifacts, so only the stamp tracks it
+        Stage("acm", SRC / "acm" / "acm_blocks.py",
+              inputs=[layout.clean_json], outputs=[],
+              args=["--path", str(layout.clean_json), "--out", str(layout.acm_out)]),
+        Stage("afc", SRC / "afc" / "afc_blocks.py",
+              inputs=[layout.clean_json],
+              outputs=[layout.afc_out / "eigenvalues.csv", layout.afc_out / "contingency_table.csv"],
+              args=["--file", str(layout.clean_json), "--out", str(layout.afc_out)]),
+    ]
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Startup budget
+--------------
+
+Measures how long each entry point takes to answer a cheap command (usually
+--help) and compares it with its budget. When an entry point is over budget,
+the slowest imports reported by `python -X importtime` are listed, which is
+where the time went.
+
+Usage:
+  python startup_budget.py            # measure every entry point
+  python startup_budget.py --runs 10  # more runs per entry point for a steadier median
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from stages import SRC
+
+# (script, arguments, budget in seconds)
+ENTRY_POINTS = [
+    (SRC / "blocks" / "clean_json.py", ["--help"], 0.15),
+    (SRC / "blocks" / "json_to_csv.py", ["--help"], 0.15),
+    (SRC / "blocks" / "export_clean.py", ["--help"], 0.15),
+    (SRC / "clustering" / "importdata.py", ["--help"], 0.15),
+    (SRC / "clustering" / "kmeans.py", ["--help"], 0.15),
+    (SRC / "clustering" / "plot_clusters.py", ["--help"], 0.15),
+    (SRC / "clustering" / "grid_search.py", ["--help"], 0.15),
+    (SRC / "clustering" / "profiles.py", ["--help"], 0.15),
+    (SRC / "clustering" / "quality.py", ["--help"], 0.15),
+    (SRC / "clustering" / "cluster_pca.py", ["--help"], 0.15),
+    (SRC / "clustering" / "query_blocks.py", ["--help"], 0.15),
+    (SRC / "clustering" / "separate_clusters.py", ["--help"], 0.15),
+    (SRC / "clustering" / "separate_clusters.py", [], 0.25),
+    (SRC / "acp" / "acp_blocks.py", ["--help"], 0.15),
+    (SRC / "acm" / "acm_blocks.py", ["--help"], 0.15),
+    (SRC / "afc" / "afc_blocks.py", ["--help"], 0.15),
+    (SRC / "pipeline" / "pipeline.py", ["--help"], 0.15),
+    (SRC / "pipeline" / "watch.py", ["--help"], 0.15),
+    (SRC / "pipeline" / "batch.py", ["--help"], 0.15),
+    # the service always needs numpy, so it is allowed its import time
+    (SRC / "service" / "serve.py", ["--help"], 0.3),
+    (SRC / "service" / "loadtest.py", ["--help"], 0.15),
+]
+
+
+def measure(script: Path, args: list[str], runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, str(script), *args], cwd=script.parent,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def slowest_imports(script: Path, args: list[str], top: int = 5) -> list[tuple[int, str]]:
+    """Cumulative import times in microseconds, as reported by -X importtime."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", str(script), *args], cwd=script.parent,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # only top-level imports (no indentation), nested ones are already counted in their parent
+        if not name[1:].startswith(" "):
+            entries.append((int(cumulative), name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Check the startup time of every entry point against its budget.")
+    p.add_argument("--runs", type=int, default=5, help="Runs per entry point, the median is kept (default: 5)")
+    args = p.parse_args()
+
+    over = 0
+    for script, script_args, budget in ENTRY_POINTS:
+        elapsed = measure(script, script_args, args.runs)
+        ok = elapsed <= budget
+        over += not ok
+        command = " ".join([os.path.relpath(script, SRC), *script_args])
+        print(f"{command:<45} {elapsed * 1000:7.0f} ms  (budget {budget * 1000:.0f} ms)  {'ok' if ok else 'OVER'}")
+        if not ok:
+            for us, name in slowest_imports(script, script_args):
+                print(f"    {us / 1000:7.1f} ms  import {name}")
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
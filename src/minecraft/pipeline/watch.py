@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Pipeline watch mode
+-------------------
+
+Stays resident and refreshes the analysis whenever the raw dataset or its
+clean JSON changes: an edit to the raw list refreshes everything, an edit to
+the clean JSON only the ACP, ACM and AFC. Only the stages downstream of the
+change run (the same staleness check as pipeline.py), and they run in worker
+processes that imported numpy, pandas, sklearn, scipy and matplotlib once at
+startup, so a refresh does not pay the interpreter and library start-up cost
+again.
+
+Project modules (importdata, const, schema, ...) are dropped from the workers
+after each stage, so edits to the scripts are picked up on the next refresh.
+
+Usage:
+  python watch.py                  # watch the default dataset files
+  python watch.py --interval 0.2   # poll more often
+"""
+
+import argparse
+import contextlib
+import os
+import runpy
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from pipeline import Pipeline, report
+import resources
+from stages import SRC, Layout, Stage, default_stages
+
+# Libraries kept loaded in the workers
+WARM_MODULES = [
+    "numpy", "pandas", "matplotlib.pyplot", "scipy.stats", "scipy.cluster.hierarchy",
+    "sklearn.cluster", "sklearn.preprocessing", "sklearn.decomposition",
+]
+OPTIONAL_WARM_MODULES = ["mca", "prince", "pyarrow"]
+
+
+def warm_up(threads: int):
+    os.environ["MPLBACKEND"] = "Agg"
+    resources.worker_init(threads)
+    for name in WARM_MODULES:
+        __import__(name)
+    for name in OPTIONAL_WARM_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            pass
+
+
+def run_script(script: str, args: list[str], env: dict[str, str], log: str) -> int:
+    """Run a stage script as __main__ inside a warm worker, like `python script args` would."""
+    saved_argv, saved_path, saved_cwd, saved_env = sys.argv, sys.path[:], os.getcwd(), os.environ.copy()
+    known_modules = set(sys.modules)
+    sys.argv = [script, *args]
+    sys.path.insert(0, str(Path(script).parent))
+    os.environ.update(env)
+    os.chdir(Path(script).parent)
+    code = 0
+    try:
+        with open(log, "w", encoding="utf-8") as f, contextlib.redirect_stdout(f), contextlib.redirect_stderr(f):
+            try:
+                runpy.run_path(script, run_name="__main__")
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+                code = 1
+    finally:
+        import matplotlib.pyplot as plt
+        plt.close("all")
+        for name in set(sys.modules) - known_modules:
+            file = getattr(sys.modules[name], "__file__", None) or ""
+            if file.startswith(str(SRC)):
+                del sys.modules[name]
+        sys.argv, sys.path[:] = saved_argv, saved_path
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_env)
+    return code
+
+
+class WarmRunner:
+    """Stage runner dispatching to a pool of pre-warmed worker processes."""
+
+    def __init__(self, workers: int, threads: int):
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=warm_up, initargs=(threads,))
+        # start every worker now rather than on the first change
+        for f in [self.pool.submit(os.getpid) for _ in range(workers)]:
+            f.result()
+
+    def __call__(self, stage: Stage, log: Path) -> int:
+        return self.pool.submit(run_script, str(stage.script), stage.args, stage.env, str(log)).result()
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def snapshot(paths: list[Path]) -> dict[Path, tuple[int, int] | None]:
+    result = {}
+    for p in paths:
+        try:
+            st = p.stat()
+            result[p] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            result[p] = None
+    return result
+
+
+def main() -> int:
+    p = argparse.ArgumentParser(description="Refresh the analysis whenever the dataset changes.")
+    resources.add_arguments(p, jobs_help="Warm worker processes", jobs_default="4")
+    p.add_argument("--interval", type=float, default=0.5, help="Seconds between two checks of the dataset files (default: 0.5)")
+    p.add_argument("--settle", type=float, default=0.2, help="Seconds a file must stay unchanged before refreshing (default: 0.2)")
+    args = p.parse_args()
+    alloc = resources.configure(args.jobs, args.threads, default_jobs=4)
+
+    layout = Layout()
+    # the clean CSV is not read by any stage: editing it would refresh nothing
+    watched = [layout.raw_json, layout.clean_json]
+    print("[INFO] Starting warm workers...")
+    runner = WarmRunner(alloc.jobs, alloc.threads)
+    pipeline = Pipeline(default_stages(layout), layout.state, runner=runner)
+
+    def refresh():
+        start = time.perf_counter()
+        results = pipeline.run(jobs=alloc.jobs)
+        if any(r.status != "skipped" for r in results.values()):
+            report(pipeline, results, time.perf_counter() - start)
+        else:
+            print("[INFO] Everything is up to date")
+
+    try:
+        refresh()
+        seen = snapshot(watched)
+        print(f"[INFO] Watching {', '.join(str(w) for w in watched)}")
+        while True:
+            time.sleep(args.interval)
+            current = snapshot(watched)
+            if current == seen:
+                continue
+            # wait for the writer to finish before reading the file
+            while True:
+                time.sleep(args.settle)
+                settled = snapshot(watched)
+                if settled == current:
+                    break
+                current = settled
+            changed = [str(path) for path in watched if current[path] != seen[path]]
+            print(f"\n[INFO] Changed: {', '.join(changed)}")
+            refresh()
+            # the refresh rewrites derived dataset files (clean JSON), which is not a new change
+            seen = snapshot(watched)
+    except KeyboardInterrupt:
+        print("\n[INFO] Stopped")
+    finally:
+        runner.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
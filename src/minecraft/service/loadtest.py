@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Load test for serve.py
+----------------------
+
+Opens `--concurrency` keep-alive connections and sends `--requests` requests in
+total to one endpoint, with rows sampled from the encoded dataset, then
+reports throughput and p50/p90/p99 latencies.
+
+Usage:
+  python loadtest.py --endpoint cluster --concurrency 64 --requests 5000
+  python loadtest.py --endpoint project --rows 10
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent
+DEFAULT_DATASET = SRC / "clustering" / "results" / "clean.csv"
+
+
+async def request(reader, writer, method: str, path: str, payload: dict | None = None) -> dict:
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = (await reader.readline()).split()[1]
+    length = 0
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    data = json.loads(await reader.readexactly(length))
+    if status != b"200":
+        raise RuntimeError(f"{path}: {status.decode()} {data}")
+    return data
+
+
+def sample_rows(dataset: Path, features: list[str]) -> list[list[float]]:
+    """Rows of the dataset with every feature filled (rows with an empty cell are skipped)."""
+    with open(dataset, newline="", encoding="utf-8") as f:
+        return [[float(row[c]) for c in features] for row in csv.DictReader(f, delimiter=";")
+                if all(row.get(c) not in (None, "") for c in features)]
+
+
+async def client(host, port, path, rows, rows_per_request, count, latencies):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(count):
+            payload = {"rows": random.sample(rows, rows_per_request)}
+            start = time.perf_counter()
+            await request(reader, writer, "POST", path, payload)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+async def run(args):
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    health = await request(reader, writer, "GET", "/health")
+    writer.close()
+    model = health[args.endpoint]
+    if model is None:
+        raise SystemExit(f"The server has no model for /{args.endpoint}")
+    rows = sample_rows(args.dataset, model["features"])
+
+    latencies: list[float] = []
+    per_client = [args.requests // args.concurrency + (i < args.requests % args.concurrency) for i in range(args.concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*(client(args.host, args.port, f"/{args.endpoint}", rows, args.rows, n, latencies)
+                           for n in per_client if n))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"/{args.endpoint}: {len(latencies)} requests x {args.rows} rows, {args.concurrency} connections")
+    print(f"Throughput: {len(latencies) / elapsed:.0f} req/s ({len(latencies) * args.rows / elapsed:.0f} rows/s)")
+    print(f"Latency: p50 {percentile(latencies, 50) * 1000:.2f} ms, p90 {percentile(latencies, 90) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.2f} ms, mean {statistics.mean(latencies) * 1000:.2f} ms")
+
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    stats = (await request(reader, writer, "GET", "/health"))["coalescing"][args.endpoint]
+    writer.close()
+    print(f"Coalescing: {stats['requests']} requests answered in {stats['batches']} batches (since server start)")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Measure the latency of serve.py under concurrent load.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--endpoint", choices=["cluster", "project"], default="cluster")
+    p.add_argument("--concurrency", type=int, default=32, help="Simultaneous connections (default: 32)")
+    p.add_argument("--requests", type=int, default=2000, help="Total requests (default: 2000)")
+    p.add_argument("--rows", type=int, default=1, help="Rows per request (default: 1)")
+    p.add_argument("--dataset", type=Path, default=DEFAULT_DATASET, help="Encoded CSV to sample rows from")
+    asyncio.run(run(p.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Block analysis service
+----------------------
+
+Small local HTTP server (standard library asyncio, numpy) answering cluster
+assignments and ACP coordinates for feature vectors, from the models written
+by clustering/kmeans.py (kmeans_model.npz) and acp/acp_blocks.py
+(acp_model.npz). The models are loaded once at startup.
+
+Concurrent requests to the same endpoint are coalesced: rows arriving within
+a short window are stacked and answered with one vectorized computation.
+
+Endpoints:
+  GET  /health    model features and sizes
+  POST /cluster   {"rows": [[...], ...]} or {"rows": [{"feature": value, ...}, ...]}
+                  -> {"clusters": [...]}
+  POST /project   same body, ACP features -> {"coordinates": [[Dim1, Dim2, ...], ...]}
+                  optional "dims": number of dimensions to return
+
+Usage:
+  python serve.py --port 8765
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from http import HTTPStatus
+from pathlib import Path
+
+import numpy as np
+
+SRC = Path(__file__).resolve().parent.parent
+sys.path.append(str(SRC / "common"))
+import resources
+
+DEFAULT_KMEANS_MODEL = SRC / "clustering" / "results" / "kmeans_model.npz"
+DEFAULT_ACP_MODEL = SRC / "acp" / "acp_outputs" / "acp_model.npz"
+MAX_BODY = 16 * 1024 * 1024
+
+
+class BadRequest(Exception):
+    pass
+
+
+class KmeansModel:
+    def __init__(self, path: Path):
+        with np.load(path) as f:
+            self.features = [str(x) for x in f["features"]]
+            self.mean = f["mean"]
+            self.scale = f["scale"]
+            self.centers = f["centers"]
+        self.centers_sq = np.einsum("ij,ij->i", self.centers, self.centers)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        Z = (X - self.mean) / self.scale
+        # argmin ||z - c||² = argmin ||c||² - 2 z·c
+        return np.argmin(self.centers_sq - 2.0 * Z @ self.centers.T, axis=1)
+
+
+class AcpModel:
+    def __init__(self, path: Path):
+        with np.load(path) as f:
+            self.features = [str(x) for x in f["features"]]
+            self.mean = f["mean"]
+            self.std = f["std"]
+            self.pca_mean = f["pca_mean"]
+            self.components = f["components"]
+
+    def project(self, X: np.ndarray) -> np.ndarray:
+        # même standardisation que zscore_standardize : colonnes constantes ramenées à 0
+        Z = np.divide(X - self.mean, self.std, out=np.zeros_like(X), where=self.std > 0)
+        return (Z - self.pca_mean) @ self.components.T
+
+
+class Coalescer:
+    """
+    Gathers the matrices submitted within `window` seconds (or until `max_rows`)
+    and runs `fn` once on their concatenation.
+    """
+
+    def __init__(self, fn, window: float, max_rows: int):
+        self.fn = fn
+        self.window = window
+        self.max_rows = max_rows
+        self.pending: list[tuple[np.ndarray, asyncio.Future]] = []
+        self.rows = 0
+        self.timer: asyncio.TimerHandle | None = None
+        self.batches = 0
+        self.requests = 0
+
+    async def submit(self, X: np.ndarray) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self.pending.append((X, fut))
+        self.rows += len(X)
+        if self.rows >= self.max_rows:
+            self._flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending, self.rows = self.pending, [], 0
+        if not batch:
+            return
+        self.batches += 1
+        self.requests += len(batch)
+        try:
+            result = self.fn(np.vstack([X for X, _ in batch]))
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        start = 0
+        for X, fut in batch:
+            if not fut.done():
+                fut.set_result(result[start:start + len(X)])
+            start += len(X)
+
+
+def parse_rows(body: dict, features: list[str]) -> np.ndarray:
+    rows = body.get("rows")
+    if not isinstance(rows, list) or not rows:
+        raise BadRequest('expected a non-empty "rows" list')
+    try:
+        if isinstance(rows[0], dict):
+            rows = [[row[f] for f in features] for row in rows]
+        X = np.asarray(rows, dtype=float)
+    except KeyError as e:
+        raise BadRequest(f"missing feature {e}")
+    except (TypeError, ValueError):
+        raise BadRequest("rows must be numeric")
+    if X.ndim != 2 or X.shape[1] != len(features):
+        raise BadRequest(f"each row needs {len(features)} values: {', '.join(features)}")
+    # json.loads accepts NaN and Infinity: a NaN row would get cluster 0, an infinite one invalid JSON back
+    if not np.isfinite(X).all():
+        raise BadRequest("rows must be finite numbers")
+    return X
+
+
+def parse_dims(body: dict) -> int | None:
+    dims = body.get("dims")
+    if dims is not None and (isinstance(dims, bool) or not isinstance(dims, int) or dims < 1):
+        raise BadRequest('"dims" must be a positive integer')
+    return dims
+
+
+class Service:
+    def __init__(self, kmeans: KmeansModel | None, acp: AcpModel | None, window: float, max_rows: int):
+        self.kmeans = kmeans
+        self.acp = acp
+        self.cluster_batcher = Coalescer(kmeans.predict, window, max_rows) if kmeans else None
+        self.project_batcher = Coalescer(acp.project, window, max_rows) if acp else None
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> tuple[HTTPStatus, dict]:
+        if path == "/health":
+            if method != "GET":
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use GET"}
+            return HTTPStatus.OK, {
+                "status": "ok",
+                "cluster": {"features": self.kmeans.features, "k": len(self.kmeans.centers)} if self.kmeans else None,
+                "project": {"features": self.acp.features, "dims": len(self.acp.components)} if self.acp else None,
+                "coalescing": {name: {"requests": b.requests, "batches": b.batches}
+                               for name, b in (("cluster", self.cluster_batcher), ("project", self.project_batcher)) if b},
+            }
+        if path not in ("/cluster", "/project"):
+            return HTTPStatus.NOT_FOUND, {"error": f"unknown endpoint {path}"}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use POST"}
+        try:
+            payload = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            return HTTPStatus.BAD_REQUEST, {"error": "invalid JSON"}
+        if not isinstance(payload, dict):
+            return HTTPStatus.BAD_REQUEST, {"error": "expected a JSON object"}
+        try:
+            if path == "/cluster":
+                if self.kmeans is None:
+                    return HTTPStatus.SERVICE_UNAVAILABLE, {"error": "no k-means model loaded"}
+                labels = await self.cluster_batcher.submit(parse_rows(payload, self.kmeans.features))
+                return HTTPStatus.OK, {"clusters": labels.tolist()}
+            if self.acp is None:
+                return HTTPStatus.SERVICE_UNAVAILABLE, {"error": "no ACP model loaded"}
+            dims = parse_dims(payload)
+            coords = await self.project_batcher.submit(parse_rows(payload, self.acp.features))
+            if dims is not None:
+                coords = coords[:, :dims]
+            return HTTPStatus.OK, {"coordinates": coords.tolist()}
+        except BadRequest as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = headers.get("content-length", "0")
+                length = int(length) if length.isascii() and length.isdigit() else -1
+                if length < 0:
+                    # without a valid length the body cannot be skipped: answer, then close
+                    status, payload = HTTPStatus.BAD_REQUEST, {"error": "invalid Content-Length"}
+                elif length > MAX_BODY:
+                    status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "body too large"}
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.dispatch(method, target.split("?", 1)[0], body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"{version} {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+                if not keep_alive or length < 0 or status == HTTPStatus.REQUEST_ENTITY_TOO_LARGE:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+
+def load_optional(cls, path: Path):
+    if not path.exists():
+        print(f"[WARN] {path} not found, run the matching stage to enable it")
+        return None
+    return cls(path)
+
+
+async def serve(args):
+    kmeans = load_optional(KmeansModel, args.kmeans_model)
+    acp = load_optional(AcpModel, args.acp_model)
+    if kmeans is None and acp is None:
+        raise SystemExit("No model to serve.")
+    service = Service(kmeans, acp, args.window / 1000, args.max_batch)
+    server = await asyncio.start_server(service.handle, args.host, args.port)
+    print(f"[INFO] Serving on http://{args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    p = argparse.ArgumentParser(description="Serve cluster assignments and ACP projections over HTTP.")
+    p.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: 127.0.0.1)")
+    p.add_argument("--port", type=int, default=8765, help="Port (default: 8765)")
+    p.add_argument("--kmeans-model", type=Path, default=DEFAULT_KMEANS_MODEL, help="Model written by kmeans.py")
+    p.add_argument("--acp-model", type=Path, default=DEFAULT_ACP_MODEL, help="Model written by acp_blocks.py")
+    p.add_argument("--window", type=float, default=2.0, help="Coalescing window in milliseconds (default: 2)")
+    p.add_argument("--max-batch", type=int, default=4096, help="Rows that trigger an immediate batch (default: 4096)")
+    resources.add_arguments(p, jobs=False)
+    args = p.parse_args()
+    resources.configure(jobs=1, threads=args.threads)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()